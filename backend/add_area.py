@@ -1,8 +1,5 @@
-import pymongo
-
-# Database connection details
-MONGO_URI = "mongodb://094510.xyz:8827/"
-DATABASE_NAME = "pwasset"
+from db import create_client, get_database
+from cache import bump_version
 
 # Area details to add
 AREA_DATA = {
@@ -13,8 +10,8 @@ AREA_DATA = {
 
 try:
     # Establish connection
-    client = pymongo.MongoClient(MONGO_URI)
-    db = client[DATABASE_NAME]
+    client = create_client()
+    db = get_database(client)
     areas_collection = db.areas
 
     # Check if the area already exists
@@ -23,6 +20,8 @@ try:
     else:
         # Insert the new area
         areas_collection.insert_one(AREA_DATA)
+        # Make running backends reload their cached areas/parks
+        bump_version(db, 'reference')
         print(f"Successfully inserted area with code '{AREA_DATA['code']}'.")
 
 except Exception as e:
@@ -1,24 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import pymongo
 import hashlib
 import jwt
 import datetime
 import os
+import json
+import base64
+import re
+import time
+import secrets
+import hmac
+import csv
+import io
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from cache import TTLCache, read_version
+from serialization import dumps, json_response, clean
+from compression import init_compression, compress_stream
+from filters import parse_filters, parse_sort, after_key
+from export import csv_chunks, xlsx_chunks, XLSX_MIMETYPE
+from audit import create_audit_writer
+from search import SEARCH_KEYS_FIELD, SEARCH_KEY_SOURCES, HIDE_SEARCH_KEYS, search_keys, keys_query, text_query
+from stats import STATS_COLLECTION, META_ID, refresh_stats_locked, apply_stats_changes, refreshed_at, month_key
+from events import ChangeHub
+from db import create_client, get_database, for_lists
+from indexes import TOMBSTONE_TTL
+from passwords import hash_password, verify_password
+from ratelimit import TokenBucketLimiter
+from metrics import init_metrics, mongo_listeners, record_caches, render_metrics
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+init_metrics(app)  # per-route latency/size histograms and slow-request log (see /metrics)
+init_compression(app)  # gzip/brotli for JSON, NDJSON and CSV responses
 
 # Configuration via environment variables (with sensible defaults)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
-MONGO_URI = os.environ.get('MONGO_URI', "mongodb://094510.xyz:8827/")
-DATABASE_NAME = os.environ.get('DATABASE_NAME', "pwasset")
 
-# Database connection
-client = pymongo.MongoClient(MONGO_URI)
-db = client[DATABASE_NAME]
+# Database connection (pool, timeouts and compression come from MONGO_* settings, see db.py)
+client = create_client(event_listeners=mongo_listeners())
+db = get_database(client)
 users_collection = db.users
 areas_collection = db.areas
 parks_collection = db.parks
@@ -26,10 +53,139 @@ asset_list_collection = db.asset_list
 transfer_list_collection = db.transfer_list
 disposal_list_collection = db.disposal_list
 logs_collection = db.logs
+# Deleted (or moved-away) rows, kept for /api/sync clients
+tombstones_collection = db.tombstones
+# Stored responses of writes sent with an Idempotency-Key (offline outbox replays)
+idempotency_collection = db.idempotency_keys
+event_tickets_collection = db.event_tickets
+# Audit log entries are queued and written in batches off the request path (see audit.py)
+audit_log = create_audit_writer(logs_collection)
 
-# MD5 encryption function
-def md5_encrypt(password):
-    return hashlib.md5(password.encode()).hexdigest()
+# Create missing indexes at startup (idempotent; see indexes.py for the CLI).
+# Runs in every worker at import, so deployments build indexes with the CLI instead
+if os.environ.get('ENSURE_INDEXES', '0') == '1':
+    from indexes import ensure_indexes
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"Index bootstrap failed: {e}")
+
+# Keyset pagination limits for list endpoints
+MAX_PAGE_LIMIT = int(os.environ.get('MAX_PAGE_LIMIT', 1000))
+# Cursor batch size used when streaming NDJSON list responses
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+# Run transfer + asset writes in one multi-document transaction (needs a replica set)
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', '0') == '1'
+# /api/stats recomputes the summary when its last full refresh is older than this
+STATS_MAX_AGE = int(os.environ.get('STATS_MAX_AGE', 3600))
+# Threads for running independent queries of one request concurrently
+query_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('QUERY_POOL_SIZE', 8)))
+# /api/sync: how far before the token each sync looks back so writes still in flight
+# when the token was issued are not missed (tombstones are kept for TOMBSTONE_TTL)
+SYNC_OVERLAP_SECONDS = 5
+# Fields the server maintains; never taken from a client's After payload
+SYSTEM_FIELDS = ('_id', 'updatedAt', 'version', SEARCH_KEYS_FIELD)
+# /api/events: one change watcher per process pushes row changes to SSE subscribers.
+# Polling is used when the server has no change streams (standalone mongod).
+# Each open stream holds a gthread worker thread, so only part of a worker's threads
+# may serve streams; the rest stay free for regular API calls
+EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS', max(1, int(os.environ.get('GUNICORN_THREADS', 4)) // 2)))
+EVENTS_RETRY_SECONDS = int(os.environ.get('EVENTS_RETRY_SECONDS', 30))
+# Bearer token required by /metrics (empty: only unproxied requests are served)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Seconds a single-use /api/events ticket stays valid
+EVENTS_TICKET_SECONDS = int(os.environ.get('EVENTS_TICKET_SECONDS', 60))
+change_hub = ChangeHub(
+    db,
+    poll_interval=float(os.environ.get('EVENTS_POLL_INTERVAL', 2)),
+    max_subscribers=EVENTS_MAX_STREAMS
+)
+EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT', 15))
+# Idempotency keys: after how long a request that never finished (e.g. its worker died)
+# may be retried with the same key; stored responses expire after IDEMPOTENCY_TTL (indexes.py)
+IDEMPOTENCY_PENDING_TIMEOUT = int(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT', 60))
+# Writes a client may replay through /api/outbox, and how many per request
+OUTBOX_OPS = {
+    f'{kind}/{action}'
+    for kind in ('assets', 'transfers', 'disposals')
+    for action in ('add', 'update', 'delete')
+}
+OUTBOX_MAX_OPS = 100
+# Largest number of rows accepted by one bulk request
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', 5000))
+# Per-view default projections for the list endpoints (?view=table), matching the
+# columns AssetList.jsx shows on each tab; 'export' is the default /api/export column set
+LIST_VIEWS = {
+    'asset_list': {
+        'table': ['When', 'Location', 'Old Asset Code', 'SN', 'Details', 'Tag', 'operator'],
+        'export': ['When', 'Location', 'Area Code', 'Old Asset Code', 'SN', 'Details', 'Tag', 'operator']
+    },
+    'transfer_list': {
+        'table': ['When', 'Old Asset Code', 'By', 'To', 'Reason', 'operator', 'Location'],
+        'export': ['When', 'Location', 'Old Asset Code', 'By', 'To', 'Reason', 'operator']
+    },
+    'disposal_list': {
+        'table': ['When', 'Location', 'Old Asset Code', 'SN', 'Details', 'Reason', 'operator'],
+        'export': ['When', 'Location', 'Old Asset Code', 'SN', 'Details', 'Reason', 'operator']
+    }
+}
+# Server-side search result limits (matching is in search.py)
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 200
+
+# In-process caches for token_required: decoded JWTs and user documents.
+# User entries are dropped when the 'users' cache version is bumped (see cache.py).
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+token_cache = TTLCache(maxsize=4096, ttl=TOKEN_CACHE_TTL)
+user_cache = TTLCache(maxsize=1024, ttl=USER_CACHE_TTL, version_fn=lambda: read_version(db, 'users'))
+# Areas and parks rarely change: keep them in memory, refreshed on TTL or when the
+# 'reference' cache version is bumped by a writer (e.g. add_area.py)
+REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', 300))
+reference_cache = TTLCache(maxsize=8, ttl=REFERENCE_CACHE_TTL, version_fn=lambda: read_version(db, 'reference'))
+
+# Login throttling: token buckets per client IP (every attempt) and per userId
+# (failed attempts only), in memory per worker process
+login_ip_limiter = TokenBucketLimiter(
+    per_minute=float(os.environ.get('LOGIN_IP_PER_MINUTE', 10)),
+    burst=int(os.environ.get('LOGIN_IP_BURST', 10)))
+login_user_limiter = TokenBucketLimiter(
+    per_minute=float(os.environ.get('LOGIN_USER_PER_MINUTE', 5)),
+    burst=int(os.environ.get('LOGIN_USER_BURST', 5)))
+# Behind nginx the client address arrives in X-Real-IP
+TRUST_PROXY = os.environ.get('TRUST_PROXY', '1') == '1'
+# userIds known not to exist, so repeated guesses skip the users lookup;
+# cleared with the user cache when the 'users' version is bumped
+unknown_user_cache = TTLCache(maxsize=10000, ttl=USER_CACHE_TTL, version_fn=lambda: read_version(db, 'users'))
+
+def client_ip():
+    if TRUST_PROXY and request.headers.get('X-Real-IP'):
+        return request.headers['X-Real-IP']
+    return request.remote_addr
+
+def too_many_attempts(retry_after):
+    response = jsonify({'message': 'Too many login attempts, please try again later.'})
+    response.headers['Retry-After'] = str(int(retry_after) + 1)
+    return response, 429
+
+# Resolve a bearer token to its user (None if unknown); raises on an invalid token
+def authenticate(token):
+    if token.startswith('Bearer '):
+        token = token[7:]
+    data = token_cache.get(token)
+    if data is None:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        # Never keep a token cached past its own expiry
+        token_cache.set(token, data, ttl=data['exp'] - time.time())
+    return load_user(data['userId'])
+
+def load_user(user_id):
+    current_user = user_cache.get(user_id)
+    if current_user is None:
+        current_user = users_collection.find_one({'userId': user_id})
+        if current_user:
+            user_cache.set(user_id, current_user)
+    return current_user
 
 # JWT token decorator
 def token_required(f):
@@ -40,16 +196,462 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = users_collection.find_one({'userId': data['userId']})
+            current_user = authenticate(token)
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
         
         return f(current_user, *args, **kwargs)
     return decorated
 
+# Apply a write at most once per Idempotency-Key (scoped to the user): a repeated key
+# gets the stored response back instead of running the handler again
+def idempotent(f):
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return f(current_user, *args, **kwargs)
+        if len(key) > 200:
+            return jsonify({'message': 'Idempotency-Key is too long'}), 400
+        record_id = f"{current_user.get('userId')}:{key}"
+        now = now_gmt8()
+        try:
+            idempotency_collection.insert_one({'_id': record_id, 'path': request.path, 'createdAt': now})
+        except DuplicateKeyError:
+            record = idempotency_collection.find_one({'_id': record_id})
+            if record and record.get('path') != request.path:
+                return jsonify({'message': 'Idempotency-Key was already used for another request'}), 422
+            if record and 'status' in record:
+                response = Response(record['body'], status=record['status'], mimetype='application/json')
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            # Take over a request that never finished; otherwise it is still running
+            claimed = idempotency_collection.find_one_and_update(
+                {'_id': record_id, 'status': {'$exists': False},
+                 'createdAt': {'$lt': now - datetime.timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT)}},
+                {'$set': {'createdAt': now}}
+            )
+            if not claimed:
+                return jsonify({'message': 'A request with this Idempotency-Key is still in progress'}), 409
+
+        response = app.make_response(f(current_user, *args, **kwargs))
+        if response.status_code >= 500:
+            # Let the client retry a failed write with the same key
+            idempotency_collection.delete_one({'_id': record_id})
+        else:
+            idempotency_collection.update_one(
+                {'_id': record_id},
+                {'$set': {'status': response.status_code, 'body': response.get_data()}}
+            )
+        return response
+    return decorated
+
+# _id of a row created by an earlier outbox add, from its stored idempotent response
+def resolve_local_id(current_user, key):
+    record = idempotency_collection.find_one({'_id': f"{current_user.get('userId')}:{key}"})
+    if not record or record.get('status') != 201:
+        return None
+    return json.loads(record['body']).get('item', {}).get('_id')
+
+# Cached areas/parks with an ETag computed from their content
+def reference_data(name):
+    entry = reference_cache.get(name)
+    if entry is None:
+        docs = list(db[name].find({}, {'_id': 0}))
+        # Encode once per refresh; every request reuses the same bytes
+        body = dumps(docs)
+        entry = {'docs': docs, 'body': body, 'etag': hashlib.md5(body).hexdigest()}
+        if name == 'parks':
+            entry['byId'] = {park.get('parkId'): park for park in docs}
+        reference_cache.set(name, entry)
+    return entry
+
+def reference_response(name):
+    entry = reference_data(name)
+    if request.if_none_match.contains(entry['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    # Let browsers store it but revalidate with If-None-Match every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Build the Location filter shared by the list endpoints
+def location_query():
+    locations_str = request.args.get('locations')
+    query = {}
+    if locations_str and locations_str.upper() != 'ALL':
+        locations_list = locations_str.split(',')
+        query['Location'] = {'$in': locations_list}
+    return query
+
+# Opaque keyset cursor built from the last row's sort values and _id; it records the
+# sort it was made for, so it cannot be replayed under a different ?sort=
+def sort_signature(sort):
+    return ','.join(f"{'-' if direction < 0 else ''}{field}" for field, direction in sort)
+
+def encode_cursor(doc, sort):
+    values = []
+    for field, _ in sort:
+        value = doc.get(field)
+        values.append({'d': value.isoformat()} if isinstance(value, datetime.datetime) else value)
+    payload = {'k': sort_signature(sort), 'v': values, 'i': str(doc['_id'])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(token, sort):
+    payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    if 'k' not in payload:
+        # Cursors issued before custom sorts: When desc only
+        payload = {'k': '-When', 'v': [{'d': payload['w']} if payload.get('w') else None], 'i': payload['i']}
+    if payload['k'] != sort_signature(sort):
+        raise ValueError('Cursor does not match sort')
+    values = [
+        datetime.datetime.fromisoformat(value['d']) if isinstance(value, dict) else value
+        for value in payload['v']
+    ]
+    return values, ObjectId(payload['i'])
+
+# Streaming mode is requested with ?stream=1 or Accept: application/x-ndjson
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return 'application/x-ndjson' in request.headers.get('Accept', '')
+
+# Mongo projection from ?fields=a,b or ?view=<name>; None returns every field
+def list_projection(collection, keep_id):
+    fields_str = request.args.get('fields')
+    view = request.args.get('view')
+    if fields_str:
+        fields = [f.strip() for f in fields_str.split(',') if f.strip()]
+    elif view:
+        fields = LIST_VIEWS.get(collection.name, {}).get(view)
+        if fields is None:
+            raise ValueError(f'Unknown view: {view}')
+    else:
+        return None
+    if not fields or any(f.startswith('$') or f == '_id' for f in fields):
+        raise ValueError('Invalid fields')
+    projection = dict.fromkeys(fields, 1)
+    projection['_id'] = 1 if keep_id else 0
+    return projection
+
+# Combine the Location query with ?filter[Field]=... conditions (see filters.py)
+def list_query(collection, query):
+    filters = parse_filters(request.args, collection.name)
+    if query and filters:
+        return {'$and': [query, filters]}
+    return query or filters
+
+# Serialize list rows; paginated when a limit is given, streamed as NDJSON on request,
+# otherwise the full list for old clients
+def list_response(collection, query, keep_id=True):
+    collection = for_lists(collection)
+    limit_str = request.args.get('limit')
+    cursor_token = request.args.get('cursor')
+    try:
+        projection = list_projection(collection, keep_id)
+        query = list_query(collection, query)
+        sort = parse_sort(request.args.get('sort'), collection.name)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if projection is None:
+        projection = HIDE_SEARCH_KEYS if keep_id else {**HIDE_SEARCH_KEYS, '_id': 0}
+
+    if not limit_str and wants_stream():
+        docs = collection.find(query, projection).sort(sort).batch_size(STREAM_BATCH_SIZE)
+
+        def generate():
+            try:
+                for doc in docs:
+                    yield dumps(doc) + b'\n'
+            finally:
+                docs.close()
+        # Tell nginx not to buffer the stream so rows reach the client as they are read
+        return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+    if not limit_str:
+        docs = collection.find(query, projection).sort(sort)
+        return json_response(list(docs))
+
+    try:
+        limit = int(limit_str)
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+
+    if cursor_token:
+        try:
+            values, last_id = decode_cursor(cursor_token, sort)
+        except Exception:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        query = {'$and': [query, after_key(sort, values, last_id)]}
+
+    # The cursor is built from the sort fields and _id, so a page always fetches them
+    if any(v for k, v in projection.items() if k != '_id'):
+        page_projection = {**projection, **{field: 1 for field, _ in sort}, '_id': 1}
+    else:
+        page_projection = {k: v for k, v in projection.items() if k != '_id'}
+    docs = list(
+        collection.find(query, page_projection)
+        .sort(sort + [('_id', sort[0][1])])
+        .limit(limit + 1)
+    )
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+    if not keep_id:
+        for doc in docs:
+            doc.pop('_id', None)
+    return json_response({'items': docs, 'nextCursor': next_cursor})
+
+# Current time in GMT+8, the timezone all When values are stored in
+def now_gmt8():
+    return datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+
+# 'YYYY-MM-DD' -> GMT+8 datetime; missing or invalid dates fall back to now
+def when_from_date(when_date):
+    if when_date:
+        try:
+            return datetime.datetime.strptime(when_date, '%Y-%m-%d') + datetime.timedelta(hours=8)
+        except Exception:
+            pass
+    return now_gmt8()
+
+# Audit log document for logs_collection
+def log_entry(action, current_user, before, after, target_type, target_id):
+    return {
+        'Action': action,
+        'operator': current_user.get('userName', ''),
+        'Before': before,
+        'After': after,
+        'time': now_gmt8().strftime('%Y-%m-%d %H:%M:%S'),
+        'targetType': target_type,
+        'targetId': target_id
+    }
+
+# Change stamps read by /api/sync: updatedAt on every write, version counts revisions
+def new_stamp():
+    return {'updatedAt': now_gmt8(), 'version': 1}
+
+# Store a new row's search keys (see search.py)
+def with_search_keys(doc):
+    doc[SEARCH_KEYS_FIELD] = search_keys(doc)
+    return doc
+
+def change_update(fields):
+    return {'$set': {**fields, 'updatedAt': now_gmt8()}, '$inc': {'version': 1}}
+
+# Optional optimistic concurrency: If-Match: "<version>" must equal the row's version
+def expected_version():
+    header = request.headers.get('If-Match', '').strip()
+    if not header or header == '*':
+        return None
+    try:
+        return int(header.replace('W/', '').strip('"'))
+    except ValueError:
+        return None
+
+# Filter for the row being changed, pinned to the If-Match version when given
+def row_filter(item_id):
+    query = {'_id': ObjectId(item_id)}
+    version = expected_version()
+    if version is not None:
+        query['version'] = version
+    return query
+
+# Response when row_filter matched nothing: 412 if the row exists at another version, else 404
+def missing_row(collection, item_id, message):
+    if expected_version() is not None:
+        current = collection.find_one({'_id': ObjectId(item_id)}, {'version': 1})
+        if current:
+            return jsonify({
+                'message': 'This item was changed by someone else. Reload it and try again.',
+                'version': current.get('version')
+            }), 412
+    return jsonify({'message': message}), 404
+
+# After-image of a change_update() applied to before, without reading it back
+def updated_image(before, update):
+    after = {**before, **update['$set']}
+    for field, delta in update.get('$inc', {}).items():
+        after[field] = (after.get(field) or 0) + delta
+    return after
+
+# Update one row in a single round trip; returns (before, after), or (None, None) if not matched
+def update_row(collection, item_id, fields, session=None):
+    update = change_update(fields)
+    before = collection.find_one_and_update(
+        row_filter(item_id), update, return_document=ReturnDocument.BEFORE, session=session
+    )
+    if before is None:
+        return None, None
+    after = updated_image(before, update)
+    # A changed code or SN needs new search keys, which depend on both
+    if any(field in fields for field in SEARCH_KEY_SOURCES):
+        keys = search_keys(after)
+        if keys != before.get(SEARCH_KEYS_FIELD):
+            collection.update_one({'_id': before['_id']}, {'$set': {SEARCH_KEYS_FIELD: keys}}, session=session)
+            after[SEARCH_KEYS_FIELD] = keys
+    return before, after
+
+# JSON response carrying the row's new version as its ETag (for a later If-Match)
+def versioned_response(body, doc):
+    response = json_response(body)
+    if doc.get('version') is not None:
+        response.set_etag(str(doc['version']))
+    return response
+
+# Drop server-maintained fields from a client's update payload
+def client_fields(after):
+    return {k: v for k, v in after.items() if k not in SYSTEM_FIELDS}
+
+# Tombstones tell sync clients a row left a location: deleted, or moved elsewhere.
+# entries are (collection name, _id, Location the row left)
+def record_tombstones(entries):
+    docs = [
+        {'collection': name, 'id': str(doc_id), 'Location': location, 'deletedAt': now_gmt8()}
+        for name, doc_id, location in entries if location
+    ]
+    if not docs:
+        return
+    try:
+        tombstones_collection.insert_many(docs, ordered=False)
+    except Exception as e:
+        print(f"Tombstone write failed: {e}")
+
+# A tombstone entry when an update moved a row out of its Location
+def moved_away(name, before, after):
+    if before and after and before.get('Location') != after.get('Location'):
+        return [(name, before['_id'], before.get('Location'))]
+    return []
+
+# Validate an add request and build the stored document; ValueError carries the 400 message
+def new_asset_doc(data, current_user):
+    location = data.get('Location')
+    details = data.get('Details')
+    if not location or not details:
+        raise ValueError('Location and Details are required!')
+
+    # Lookup area code from parks by location (parkId)
+    park = reference_data('parks')['byId'].get(location)
+    area_code = park.get('areaCode') if park else ''
+
+    return with_search_keys({
+        # Use GMT+8 time for registration
+        'When': now_gmt8(),
+        'Old Asset Code': data.get('Old Asset Code') or '',
+        'SN': data.get('SN') or '',
+        'operator': current_user.get('userName', ''),
+        'Details': details,
+        'Tag': 'onsite',
+        '_syncOrigin': 'A',
+        'Location': location,
+        'Area Code': area_code,
+        **new_stamp()
+    })
+
+def new_transfer_doc(data, current_user):
+    old_asset_code = data.get('Old Asset Code')
+    to_location = data.get('To')
+    if not old_asset_code or not to_location:
+        raise ValueError('Old Asset Code and To are required!')
+
+    return with_search_keys({
+        'Old Asset Code': old_asset_code,
+        'By': data.get('By') or '',
+        'To': to_location,
+        'Reason': data.get('Reason') or 'Operation',
+        'When': when_from_date(data.get('whenDate')),  # 'YYYY-MM-DD'
+        'operator': current_user.get('userName', ''),
+        # For location-based filtering, store target park in Location
+        'Location': to_location,
+        **new_stamp()
+    })
+
+def new_disposal_doc(data, current_user):
+    location = data.get('Location')
+    old_asset_code = data.get('Old Asset Code')
+    reason_base = data.get('reasonBase')  # 'Scrapped' | 'Sold to Third Party' | 'Trade in'
+    vendor = data.get('Vendor') or ''
+
+    if not location or not old_asset_code or not reason_base:
+        raise ValueError('Location, Old Asset Code, and reason are required!')
+
+    if reason_base in ['Sold to Third Party', 'Trade in'] and not vendor:
+        raise ValueError('Vendor is required for selected reason!')
+
+    if reason_base == 'Sold to Third Party':
+        reason = f"Sold To {vendor}"
+    elif reason_base == 'Trade in':
+        reason = f"Trade in to {vendor}"
+    else:
+        reason = 'Scrapped'
+
+    return with_search_keys({
+        'Location': location,
+        'Old Asset Code': old_asset_code,
+        'SN': data.get('SN') or '',
+        'Details': data.get('Details') or '',
+        'Reason': reason,
+        'When': when_from_date(data.get('whenDate')),  # 'YYYY-MM-DD'
+        'operator': current_user.get('userName', ''),
+        **new_stamp()
+    })
+
+# Move the transferred asset to the transfer's target park
+def asset_move(to_location, when_dt, current_user):
+    return change_update({
+        'Location': to_location,
+        'When': when_dt,
+        'operator': current_user.get('userName', '')
+    })
+
+# Move the asset with this code in one round trip; returns its previous _id/Location, or None if not found
+def move_asset(old_asset_code, to_location, when_dt, current_user, session=None):
+    return asset_list_collection.find_one_and_update(
+        {'Old Asset Code': old_asset_code},
+        asset_move(to_location, when_dt, current_user),
+        projection={'_id': 1, 'Location': 1},
+        session=session
+    )
+
+# Summary counter a document contributes to in stats_summary: (Location, field)
+def stats_key(doc, kind):
+    if not doc:
+        return None
+    if kind == 'assets':
+        return (doc.get('Location'), 'assets')
+    month = month_key(doc.get('When'))
+    return (doc.get('Location'), f'{kind}.{month}') if month else None
+
+# Counter changes for a document going from before to after (either may be None)
+def stats_changes(kind, before=None, after=None):
+    old, new = stats_key(before, kind), stats_key(after, kind)
+    if old == new:
+        return []
+    changes = []
+    if old:
+        changes.append((*old, -1))
+    if new:
+        changes.append((*new, 1))
+    return changes
+
+# Best effort: a failed increment is corrected by the next full refresh
+def record_stats(changes):
+    try:
+        apply_stats_changes(db, changes)
+    except Exception as e:
+        print(f"Stats update failed: {e}")
+
+# Run write(session) inside a transaction when MONGO_TRANSACTIONS is on, else without a session
+def run_write(write):
+    if not MONGO_TRANSACTIONS:
+        return write(None)
+    with client.start_session() as session:
+        return session.with_transaction(write)
+
 # Login endpoint
 @app.route('/api/login', methods=['POST'])
 def login():
@@ -61,16 +663,30 @@ def login():
         
         if not userId or not password:
             return jsonify({'message': 'UserId and password are required!'}), 400
+
+        retry_after = login_ip_limiter.consume(client_ip()) or login_user_limiter.retry_after(userId)
+        if retry_after:
+            return too_many_attempts(retry_after)
         
         # Find user in database
-        user = users_collection.find_one({'userId': userId})
+        user = None if unknown_user_cache.get(userId) else users_collection.find_one({'userId': userId})
         
         if not user:
+            unknown_user_cache.set(userId, True)
+            login_user_limiter.consume(userId)
             return jsonify({'message': 'Invalid credentials!'}), 401
         
-        # Verify password
-        if user['password'] != md5_encrypt(password):
+        # Verify password (scrypt/argon2, or a legacy MD5 digest)
+        ok, needs_rehash = verify_password(password, user.get('password'))
+        if not ok:
+            login_user_limiter.consume(userId)
             return jsonify({'message': 'Invalid credentials!'}), 401
+        if needs_rehash:
+            # Upgrade the stored hash now that the plain password is at hand
+            users_collection.update_one(
+                {'userId': userId, 'password': user['password']},
+                {'$set': {'password': hash_password(password)}}
+            )
         
         # Generate JWT token with duration based on remember option
         exp_delta = datetime.timedelta(days=7) if remember7Days else datetime.timedelta(hours=24)
@@ -97,16 +713,43 @@ def login():
 @app.route('/api/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
-    return jsonify({
+    return json_response({
         'user': {
             'userId': current_user['userId'],
             'userName': current_user['userName'],
             'userGroup': current_user['userGroup'],
             'parkIds': current_user['parkIds'],
-            'parks': list(parks_collection.find({'parkId': {'$in': current_user['parkIds']}}, {'_id': 0}))
+            'parks': [p for p in reference_data('parks')['docs'] if p.get('parkId') in current_user['parkIds']]
         }
+    })
+
+# Cache hit/miss counters
+@app.route('/api/cache/stats', methods=['GET'])
+@token_required
+def cache_stats(current_user):
+    return jsonify({
+        'token': token_cache.stats(),
+        'user': user_cache.stats(),
+        'reference': reference_cache.stats(),
+        'unknownUser': unknown_user_cache.stats(),
+        'loginLimits': {'ip': login_ip_limiter.stats(), 'user': login_user_limiter.stats()},
+        'auditLog': audit_log.stats()
     }), 200
 
+# Prometheus metrics for this worker process. With METRICS_TOKEN set, scrapes must send
+# it as a Bearer token; without it, only direct (unproxied) requests are served.
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if METRICS_TOKEN:
+        sent = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(sent.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return jsonify({'message': 'Token is invalid!'}), 401
+    elif request.headers.get('X-Forwarded-For') or request.headers.get('X-Real-IP'):
+        return jsonify({'message': 'Not found'}), 404
+    record_caches({'token': token_cache, 'user': user_cache, 'reference': reference_cache,
+                   'unknown_user': unknown_user_cache})
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -116,101 +759,431 @@ def health_check():
 @app.route('/api/areas', methods=['GET'])
 @token_required
 def get_areas(current_user):
-    areas = list(areas_collection.find({}, {'_id': 0}))
-    return jsonify(areas)
+    return reference_response('areas')
 
 # Get all parks
 @app.route('/api/parks', methods=['GET'])
 @token_required
 def get_parks(current_user):
-    parks = list(parks_collection.find({}, {'_id': 0}))
-    return jsonify(parks)
+    return reference_response('parks')
 
 # Get assets by location
 @app.route('/api/assets', methods=['GET'])
 @token_required
 def get_assets(current_user):
-    locations_str = request.args.get('locations')
-    
-    query = {}
-    if locations_str and locations_str.upper() != 'ALL':
-        locations_list = locations_str.split(',')
-        query['Location'] = {'$in': locations_list}
-        
     try:
-        # Exclude _id and convert ISODate to string for JSON serialization
-        assets = asset_list_collection.find(query).sort('When', pymongo.DESCENDING)
-        
-        # Manual serialization to handle datetime
-        result = []
-        for asset in assets:
-            if 'When' in asset and isinstance(asset['When'], datetime.datetime):
-                asset['When'] = asset['When'].isoformat()
-            # Convert _id to string for frontend actions
-            if '_id' in asset:
-                asset['_id'] = str(asset['_id'])
-            result.append(asset)
-            
-        return jsonify(result), 200
+        return list_response(asset_list_collection, location_query())
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 
-# Add new asset
-@app.route('/api/assets/add', methods=['POST'])
+# Rank: exact code match, then code prefix, SN prefix, code/SN substring, Details words
+def search_rank(doc, q):
+    lower = q.lower()
+    code = str(doc.get('Old Asset Code') or '').strip().lower()
+    sn = str(doc.get('SN') or '').strip().lower()
+    if code == lower:
+        return 0
+    if code.startswith(lower):
+        return 1
+    if sn.startswith(lower):
+        return 2
+    if lower in code or lower in sn:
+        return 3
+    return 4
+
+# Search assets, transfers and disposals on the server: Old Asset Code and SN by
+# case-insensitive substring (search keys), Details by word ($text)
+@app.route('/api/search', methods=['GET'])
 @token_required
-def add_asset(current_user):
+def search(current_user):
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'items': []}), 200
     try:
-        data = request.get_json() or {}
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    try:
+        location = location_query()
+        sources = [
+            ('Asset', asset_list_collection),
+            ('Transfer', transfer_list_collection),
+            ('Disposal', disposal_list_collection)
+        ]
+        matches = {}
+        for type_name, collection in sources:
+            docs = list(collection.find({**location, **keys_query(q)}, HIDE_SEARCH_KEYS)
+                        .sort('When', pymongo.DESCENDING).limit(limit))
+            try:
+                docs += collection.find({**location, **text_query(q)}, HIDE_SEARCH_KEYS) \
+                    .sort('When', pymongo.DESCENDING).limit(limit)
+            except OperationFailure as e:
+                # No text index yet (run python indexes.py): codes and SN still match
+                print(f"Details search skipped on {collection.name}: {e}")
+            for doc in docs:
+                doc['_type'] = type_name
+                matches.setdefault((type_name, doc['_id']), doc)
+        matches = list(matches.values())
 
-        location = data.get('Location')
-        old_asset_code = data.get('Old Asset Code')
-        sn = data.get('SN')
-        details = data.get('Details')
+        # Stable sorts: newest first, then by rank
+        matches.sort(key=lambda d: d['When'] if isinstance(d.get('When'), datetime.datetime) else datetime.datetime.min, reverse=True)
+        matches.sort(key=lambda d: search_rank(d, q))
 
-        if not location or not details:
-            return jsonify({'message': 'Location and Details are required!'}), 400
+        return json_response({'items': matches[:limit]})
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
 
-        # Lookup area code from parks by location (parkId)
-        park = parks_collection.find_one({'parkId': location})
-        area_code = park.get('areaCode') if park else ''
+# Refresh a stale summary off the request path; requests keep serving the current one.
+# One refresh per process at a time, and the lock in stats.py allows one across processes.
+stats_refresh_running = threading.Lock()
 
-        # Use GMT+8 time for registration
-        when_dt = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-
-        doc = {
-            'When': when_dt,
-            'Old Asset Code': old_asset_code or '',
-            'SN': sn or '',
-            'operator': current_user.get('userName', ''),
-            'Details': details,
-            'Tag': 'onsite',
-            '_syncOrigin': 'A',
-            'Location': location,
-            'Area Code': area_code
+def refresh_stats_in_background():
+    if not stats_refresh_running.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh_stats_locked(db)
+        except Exception as e:
+            print(f"Stats refresh failed: {e}")
+        finally:
+            stats_refresh_running.release()
+    threading.Thread(target=run, name='stats-refresh', daemon=True).start()
+
+# Per-park and per-area counts from the materialized stats summary
+@app.route('/api/stats', methods=['GET'])
+@token_required
+def get_stats(current_user):
+    try:
+        last_refresh = refreshed_at(db)
+        if last_refresh is None:
+            # Nothing to serve yet: build it now (unless another process already is)
+            refresh_stats_locked(db)
+            last_refresh = refreshed_at(db)
+        elif (now_gmt8() - last_refresh).total_seconds() > STATS_MAX_AGE:
+            refresh_stats_in_background()
+
+        query = {'_id': {'$ne': META_ID}}
+        locations = location_query().get('Location')
+        if locations:
+            query['_id'] = locations
+        parks_by_id = reference_data('parks')['byId']
+
+        parks = []
+        areas = {}
+        for doc in db[STATS_COLLECTION].find(query).sort('_id', pymongo.ASCENDING):
+            area_code = (parks_by_id.get(doc['_id']) or {}).get('areaCode', '')
+            row = {
+                'location': doc['_id'],
+                'areaCode': area_code,
+                'assets': doc.get('assets', 0),
+                'transfers': doc.get('transfers', {}),
+                'disposals': doc.get('disposals', {})
+            }
+            parks.append(row)
+            area = areas.setdefault(area_code, {'areaCode': area_code, 'assets': 0, 'transfers': {}, 'disposals': {}})
+            area['assets'] += row['assets']
+            for kind in ('transfers', 'disposals'):
+                for month, count in row[kind].items():
+                    area[kind][month] = area[kind].get(month, 0) + count
+        return json_response({'parks': parks, 'areas': list(areas.values()), 'refreshedAt': last_refresh})
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+# Log 'time' strings are GMT+8 'YYYY-MM-DD HH:MM:SS'
+def log_time(entry):
+    try:
+        return datetime.datetime.strptime(entry.get('time', ''), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+# Timeline of one asset: its transfers, disposals and audit log entries, oldest first
+@app.route('/api/assets/<path:code>/history', methods=['GET'])
+@token_required
+def get_asset_history(current_user, code):
+    try:
+        # QR codes may carry the asset's _id instead of its code
+        if ObjectId.is_valid(code):
+            by_id = asset_list_collection.find_one({'_id': ObjectId(code)}, {'Old Asset Code': 1})
+            if by_id and by_id.get('Old Asset Code'):
+                code = by_id['Old Asset Code']
+
+        by_code = {'Old Asset Code': code}
+        futures = {
+            'assets': query_pool.submit(lambda: list(asset_list_collection.find(by_code))),
+            'transfers': query_pool.submit(lambda: list(transfer_list_collection.find(by_code))),
+            'disposals': query_pool.submit(lambda: list(disposal_list_collection.find(by_code))),
+            'logs': query_pool.submit(lambda: list(logs_collection.find(
+                {'$or': [{'Before.Old Asset Code': code}, {'After.Old Asset Code': code}]},
+                {'_id': 0}
+            )))
+        }
+        found = {name: future.result() for name, future in futures.items()}
+
+        timeline = []
+        for doc in found['transfers']:
+            timeline.append({'type': 'transfer', 'when': doc.get('When'), 'item': doc})
+        for doc in found['disposals']:
+            timeline.append({'type': 'disposal', 'when': doc.get('When'), 'item': doc})
+        for entry in found['logs']:
+            timeline.append({'type': 'log', 'when': log_time(entry), 'item': entry})
+        timeline.sort(key=lambda e: e['when'] if isinstance(e['when'], datetime.datetime) else datetime.datetime.min)
+
+        return json_response({'code': code, 'assets': found['assets'], 'timeline': timeline})
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+# Sync tokens are opaque; they carry the server time the previous sync started at
+def encode_sync_token(when):
+    return base64.urlsafe_b64encode(json.dumps({'t': when.isoformat()}).encode()).decode()
+
+def decode_sync_token(token):
+    return datetime.datetime.fromisoformat(json.loads(base64.urlsafe_b64decode(token.encode()).decode())['t'])
+
+# Rows changed and removed since the token, for the requested locations.
+# Clients apply 'deleted' before 'changed' (a moved row appears in both) and dedupe by _id.
+@app.route('/api/sync', methods=['GET'])
+@token_required
+def sync_changes(current_user):
+    started = now_gmt8()
+    since_token = request.args.get('since')
+    if not since_token:
+        # No baseline yet: load the lists in full, then sync from this token
+        return json_response({'reset': True, 'token': encode_sync_token(started)})
+    try:
+        since = decode_sync_token(since_token)
+    except Exception:
+        return jsonify({'message': 'Invalid sync token'}), 400
+    if (started - since).total_seconds() > TOMBSTONE_TTL:
+        # Deletions older than the tombstone retention are gone; start over
+        return json_response({'reset': True, 'token': encode_sync_token(started)})
+
+    try:
+        location = location_query()
+        window = {'$gte': since - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)}
+        sources = {
+            'assets': asset_list_collection,
+            'transfers': transfer_list_collection,
+            'disposals': disposal_list_collection
+        }
+        changed = {
+            name: query_pool.submit(lambda c=collection: list(c.find({**location, 'updatedAt': window}, HIDE_SEARCH_KEYS)))
+            for name, collection in sources.items()
+        }
+        removed = query_pool.submit(lambda: list(tombstones_collection.find(
+            {**location, 'deletedAt': window}, {'_id': 0, 'collection': 1, 'id': 1}
+        )))
+
+        deleted = {name: [] for name in sources}
+        for stone in removed.result():
+            name = {c.name: n for n, c in sources.items()}.get(stone['collection'])
+            if name:
+                deleted[name].append(stone['id'])
+        return json_response({
+            'changed': {name: future.result() for name, future in changed.items()},
+            'deleted': deleted,
+            'token': encode_sync_token(started)
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+# Stream a whole list as a CSV (optionally gzipped) or XLSX download for the given
+# locations and/or areas (?areas=A1,A2 expands to the areas' parks). Rows go from the
+# cursor to the writer in batches, so memory does not grow with the export size.
+@app.route('/api/export', methods=['GET'])
+@token_required
+def export_list(current_user):
+    sources = {
+        'assets': asset_list_collection,
+        'transfers': transfer_list_collection,
+        'disposals': disposal_list_collection
+    }
+    kind = request.args.get('type', 'assets')
+    fmt = request.args.get('format', 'csv')
+    gzipped = request.args.get('gzip') in ('1', 'true')
+    if kind not in sources:
+        return jsonify({'message': f"type must be one of: {', '.join(sources)}"}), 400
+    if fmt not in ('csv', 'xlsx'):
+        return jsonify({'message': 'format must be csv or xlsx'}), 400
+    if gzipped and fmt != 'csv':
+        return jsonify({'message': 'gzip is only available for csv (xlsx is already compressed)'}), 400
+
+    collection = for_lists(sources[kind])
+    try:
+        projection = list_projection(collection, keep_id=False) or {
+            **dict.fromkeys(LIST_VIEWS[collection.name]['export'], 1), '_id': 0
         }
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    columns = [field for field in projection if field != '_id']
+
+    query = location_query()
+    areas_str = request.args.get('areas')
+    if areas_str:
+        areas = set(areas_str.split(','))
+        parks = [park.get('parkId') for park in reference_data('parks')['docs'] if park.get('areaCode') in areas]
+        if 'Location' in query:
+            parks = [park for park in parks if park in query['Location']['$in']]
+        query['Location'] = {'$in': parks}
+
+    try:
+        query = list_query(collection, query)
+        sort = parse_sort(request.args.get('sort'), collection.name)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        docs = collection.find(query, projection).sort(sort).batch_size(STREAM_BATCH_SIZE)
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+    def generate():
+        try:
+            chunks = csv_chunks(docs, columns) if fmt == 'csv' else xlsx_chunks(docs, columns, kind)
+            yield from (compress_stream(chunks, 'gzip') if gzipped else chunks)
+        finally:
+            docs.close()
+
+    filename = f"{kind}-{now_gmt8():%Y%m%d-%H%M}.{fmt}" + ('.gz' if gzipped else '')
+    if fmt == 'xlsx':
+        mimetype = XLSX_MIMETYPE
+    else:
+        mimetype = 'application/gzip' if gzipped else 'text/csv'
+    response = Response(generate(), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Replay a batch of queued offline writes in order. Each op is
+# {"key": <Idempotency-Key>, "op": "assets/add", "body": {...}, "ifMatch": <version>}
+# and runs through the normal endpoint, so a retried batch never applies a write
+# twice. An "id" of "local-<key>" refers to the row created by that earlier add.
+@app.route('/api/outbox', methods=['POST'])
+@token_required
+def replay_outbox(current_user):
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'message': 'ops must be a non-empty list'}), 400
+    if len(ops) > OUTBOX_MAX_OPS:
+        return jsonify({'message': f'At most {OUTBOX_MAX_OPS} ops per request'}), 400
+
+    authorization = request.headers.get('Authorization')
+    results = []
+    for op in ops:
+        key = op.get('key') if isinstance(op, dict) else None
+        action = op.get('op') if isinstance(op, dict) else None
+        body = dict(op.get('body') or {}) if isinstance(op, dict) else {}
+        if not key or action not in OUTBOX_OPS:
+            results.append({'key': key, 'status': 400, 'body': {'message': 'Invalid operation'}})
+            continue
+        item_id = body.get('id')
+        if isinstance(item_id, str) and item_id.startswith('local-'):
+            body['id'] = resolve_local_id(current_user, item_id[len('local-'):])
+            if not body['id']:
+                results.append({'key': key, 'status': 424, 'body': {'message': 'The item this change refers to was never created'}})
+                continue
+        headers = {'Authorization': authorization, 'Idempotency-Key': key}
+        if op.get('ifMatch') is not None:
+            headers['If-Match'] = f'"{op["ifMatch"]}"'
+        # A fresh app context keeps the inner request's g apart from this one
+        with app.app_context(), app.test_request_context(f'/api/{action}', method='POST', json=body, headers=headers):
+            response = app.full_dispatch_request()
+        results.append({'key': key, 'status': response.status_code, 'body': response.get_json(silent=True)})
+    return json_response({'results': results})
+
+# Single-use ticket for opening /api/events. EventSource cannot send the Authorization
+# header, and a JWT in the query string would be written to the access logs.
+@app.route('/api/events/ticket', methods=['POST'])
+@token_required
+def create_events_ticket(current_user):
+    ticket = secrets.token_urlsafe(32)
+    event_tickets_collection.insert_one({'_id': ticket, 'userId': current_user['userId'], 'createdAt': now_gmt8()})
+    return jsonify({'ticket': ticket, 'expiresIn': EVENTS_TICKET_SECONDS})
+
+# Server-Sent Events for row changes in the user's parks (and ?locations= subset).
+# Authenticated with ?ticket= (from /api/events/ticket) or the Authorization header.
+# Events only say what changed; clients fetch the rows with /api/sync.
+@app.route('/api/events', methods=['GET'])
+def change_events():
+    ticket = request.args.get('ticket')
+    if ticket:
+        record = event_tickets_collection.find_one_and_delete({'_id': ticket})
+        if not record or (now_gmt8() - record['createdAt']).total_seconds() > EVENTS_TICKET_SECONDS:
+            return jsonify({'message': 'Ticket is invalid or expired!'}), 401
+        current_user = load_user(record['userId'])
+    else:
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'message': 'Token is missing!'}), 401
+        try:
+            current_user = authenticate(token)
+        except:
+            return jsonify({'message': 'Token is invalid!'}), 401
+    if not current_user:
+        return jsonify({'message': 'User not found'}), 404
+
+    locations = set(current_user.get('parkIds', []))
+    requested = location_query().get('Location')
+    if requested:
+        locations &= set(requested['$in'])
+    subscriber = change_hub.subscribe(locations)
+    if subscriber is None:
+        # This worker's stream slots are taken; the client retries later (and syncs meanwhile)
+        response = Response(f"retry: {EVENTS_RETRY_SECONDS * 1000}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(EVENTS_RETRY_SECONDS)
+        return response
+
+    def generate():
+        try:
+            yield f"retry: 5000\nevent: ready\ndata: {dumps({'mode': change_hub.mode}).decode()}\n\n"
+            while True:
+                if subscriber.overflowed:
+                    # Events were dropped; the client should run a full /api/sync
+                    subscriber.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+                try:
+                    event = subscriber.queue.get(timeout=EVENTS_HEARTBEAT)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {dumps(event).decode()}\n\n"
+        finally:
+            change_hub.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    # Also frees the slot if the client goes away before the stream starts
+    response.call_on_close(lambda: change_hub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Add new asset
+@app.route('/api/assets/add', methods=['POST'])
+@token_required
+@idempotent
+def add_asset(current_user):
+    try:
+        data = request.get_json() or {}
+        try:
+            doc = new_asset_doc(data, current_user)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
         result = asset_list_collection.insert_one(doc)
 
         # Prepare output with ISO string for When
-        output = {**doc, '_id': str(result.inserted_id)}
-        if isinstance(output['When'], datetime.datetime):
-            output['When'] = output['When'].isoformat()
+        output = {**clean(doc), '_id': str(result.inserted_id)}
 
         # Write log: add
-        try:
-            logs_collection.insert_one({
-                'Action': 'add',
-                'operator': current_user.get('userName', ''),
-                'Before': {},
-                'After': {k: v for k, v in output.items() if k != '_id'},
-                'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-                'targetType': 'asset',
-                'targetId': output.get('_id')
-            })
-        except Exception:
-            pass
-        return jsonify({'message': 'Asset added successfully', 'item': output}), 201
+        audit_log.write(log_entry('add', current_user, {}, clean(output), 'asset', output.get('_id')))
+        record_stats(stats_changes('assets', None, doc))
+        return json_response({'message': 'Asset added successfully', 'item': output}, 201)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
@@ -219,106 +1192,49 @@ def add_asset(current_user):
 @app.route('/api/transfers', methods=['GET'])
 @token_required
 def get_transfers(current_user):
-    locations_str = request.args.get('locations')
-    
-    query = {}
-    if locations_str and locations_str.upper() != 'ALL':
-        locations_list = locations_str.split(',')
-        query['Location'] = {'$in': locations_list}
-        
     try:
-        transfers = transfer_list_collection.find(query, {'_id': 0}).sort('When', pymongo.DESCENDING)
-        
-        result = []
-        for transfer in transfers:
-            if 'When' in transfer and isinstance(transfer['When'], datetime.datetime):
-                transfer['When'] = transfer['When'].isoformat()
-            result.append(transfer)
-            
-        return jsonify(result), 200
+        # _id is only sent on request (?ids=1), e.g. for the offline store
+        keep_id = request.args.get('ids') in ('1', 'true')
+        return list_response(transfer_list_collection, location_query(), keep_id=keep_id)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Add new transfer record
 @app.route('/api/transfers/add', methods=['POST'])
 @token_required
+@idempotent
 def add_transfer(current_user):
     try:
         data = request.get_json() or {}
+        try:
+            doc = new_transfer_doc(data, current_user)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
-        old_asset_code = data.get('Old Asset Code')
-        by = data.get('By') or ''
-        to_location = data.get('To')
-        reason = data.get('Reason') or 'Operation'
-        when_date = data.get('whenDate')  # 'YYYY-MM-DD'
-
-        if not old_asset_code or not to_location:
-            return jsonify({'message': 'Old Asset Code and To are required!'}), 400
+        # Insert the transfer and move its asset (Location, When) as one write path
+        def write(session):
+            result = transfer_list_collection.insert_one(doc, session=session)
+            moved = move_asset(doc['Old Asset Code'], doc['To'], doc['When'], current_user, session=session)
+            return result, moved
 
-        # Determine When (GMT+8)
-        if when_date:
-            try:
-                base_dt = datetime.datetime.strptime(when_date, '%Y-%m-%d')
-                when_dt = base_dt + datetime.timedelta(hours=8)
-            except Exception:
-                when_dt = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-        else:
-            when_dt = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-
-        doc = {
-            'Old Asset Code': old_asset_code,
-            'By': by,
-            'To': to_location,
-            'Reason': reason,
-            'When': when_dt,
-            'operator': current_user.get('userName', ''),
-            # For location-based filtering, store target park in Location
-            'Location': to_location
-        }
-
-        result = transfer_list_collection.insert_one(doc)
-
-        # Update corresponding asset's Location and When
-        try:
-            before_asset = asset_list_collection.find_one({'Old Asset Code': old_asset_code})
-            if before_asset:
-                asset_list_collection.update_one(
-                    {'_id': before_asset['_id']},
-                    {'$set': {
-                        'Location': to_location,
-                        'When': when_dt,
-                        'operator': current_user.get('userName', '')
-                    }}
-                )
-        except Exception:
-            # Non-blocking if asset not found or update fails
-            pass
+        result, moved = run_write(write)
+        asset_found = moved is not None
+        record_stats(stats_changes('transfers', None, doc) + stats_changes('assets', moved, moved and {'Location': doc['To']}))
+        record_tombstones(moved_away('asset_list', moved, moved and {'Location': doc['To']}))
 
         # Prepare output
-        output = {**doc, '_id': str(result.inserted_id)}
-        if isinstance(output['When'], datetime.datetime):
-            output['When'] = output['When'].isoformat()
+        output = {**clean(doc), '_id': str(result.inserted_id)}
 
         # Write log: add transfer
-        try:
-            logs_collection.insert_one({
-                'Action': 'add',
-                'operator': current_user.get('userName', ''),
-                'Before': {},
-                'After': {k: v for k, v in output.items() if k != '_id'},
-                'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-                'targetType': 'transfer',
-                'targetId': output.get('_id')
-            })
-        except Exception:
-            pass
-        return jsonify({'message': 'Transfer added successfully', 'item': output}), 201
+        audit_log.write(log_entry('add', current_user, {}, clean(output), 'transfer', output.get('_id')))
+        return json_response({'message': 'Transfer added successfully', 'item': output, 'assetFound': asset_found}, 201)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Update transfer record
 @app.route('/api/transfers/update', methods=['POST'])
 @token_required
+@idempotent
 def update_transfer(current_user):
     try:
         data = request.get_json() or {}
@@ -326,86 +1242,60 @@ def update_transfer(current_user):
         after = data.get('After') or {}
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = transfer_list_collection.find_one({'_id': ObjectId(item_id)})
-        if not before_doc:
-            return jsonify({'message': 'Transfer not found'}), 404
-
         # Normalize When if provided as date string
         if 'When' in after and isinstance(after['When'], str):
-            try:
-                base_dt = datetime.datetime.strptime(after['When'], '%Y-%m-%d')
-                after['When'] = base_dt + datetime.timedelta(hours=8)
-            except Exception:
-                after['When'] = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+            after['When'] = when_from_date(after['When'])
 
         after['operator'] = current_user.get('userName', '')
 
-        transfer_list_collection.update_one({'_id': ObjectId(item_id)}, {'$set': after})
-        updated = transfer_list_collection.find_one({'_id': ObjectId(item_id)})
-
-        # If To/When changed, reflect in asset_list
-        try:
+        # Update the transfer and reflect To/When in asset_list as one write path
+        def write(session):
+            before_doc, updated = update_row(transfer_list_collection, item_id, client_fields(after), session=session)
+            if not before_doc:
+                return None, None, None
             target_code = updated.get('Old Asset Code')
             to_location = updated.get('To')
             when_dt = updated.get('When')
+            moved = None
             if target_code and to_location:
-                asset_list_collection.update_one(
-                    {'Old Asset Code': target_code},
-                    {'$set': {
-                        'Location': to_location,
-                        'When': when_dt if isinstance(when_dt, datetime.datetime) else datetime.datetime.utcnow() + datetime.timedelta(hours=8),
-                        'operator': current_user.get('userName', '')
-                    }}
+                moved = move_asset(
+                    target_code, to_location,
+                    when_dt if isinstance(when_dt, datetime.datetime) else now_gmt8(),
+                    current_user, session=session
                 )
-        except Exception:
-            pass
+            return before_doc, updated, moved
 
-        # Serialize for response
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'update',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': clean(updated),
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'transfer',
-            'targetId': item_id
-        })
-        return jsonify({'message': 'Transfer updated successfully', 'item': {**clean(updated), '_id': str(updated['_id'])}}), 200
+        before_doc, updated, moved = run_write(write)
+        if not before_doc:
+            return missing_row(transfer_list_collection, item_id, 'Transfer not found')
+        asset_found = moved is not None
+        record_stats(stats_changes('transfers', before_doc, updated) + stats_changes('assets', moved, moved and {'Location': updated.get('To')}))
+        record_tombstones(
+            moved_away('transfer_list', before_doc, updated)
+            + moved_away('asset_list', moved, moved and {'Location': updated.get('To')})
+        )
+
+        audit_log.write(log_entry('update', current_user, clean(before_doc), clean(updated), 'transfer', item_id))
+        return versioned_response({'message': 'Transfer updated successfully', 'item': updated, 'assetFound': asset_found}, updated)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Delete transfer record
 @app.route('/api/transfers/delete', methods=['POST'])
 @token_required
+@idempotent
 def delete_transfer(current_user):
     try:
         data = request.get_json() or {}
         item_id = data.get('id')
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = transfer_list_collection.find_one({'_id': ObjectId(item_id)})
+        before_doc = transfer_list_collection.find_one_and_delete(row_filter(item_id))
         if not before_doc:
-            return jsonify({'message': 'Transfer not found'}), 404
-        transfer_list_collection.delete_one({'_id': ObjectId(item_id)})
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'delete',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': {},
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'transfer',
-            'targetId': item_id
-        })
+            return missing_row(transfer_list_collection, item_id, 'Transfer not found')
+        audit_log.write(log_entry('delete', current_user, clean(before_doc), {}, 'transfer', item_id))
+        record_stats(stats_changes('transfers', before_doc, None))
+        record_tombstones([('transfer_list', before_doc['_id'], before_doc.get('Location'))])
         return jsonify({'message': 'Transfer deleted successfully'}), 200
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
@@ -414,103 +1304,39 @@ def delete_transfer(current_user):
 @app.route('/api/disposals', methods=['GET'])
 @token_required
 def get_disposals(current_user):
-    locations_str = request.args.get('locations')
-    
-    query = {}
-    if locations_str and locations_str.upper() != 'ALL':
-        locations_list = locations_str.split(',')
-        query['Location'] = {'$in': locations_list}
-        
     try:
-        disposals = disposal_list_collection.find(query).sort('When', pymongo.DESCENDING)
-        
-        result = []
-        for disposal in disposals:
-            if 'When' in disposal and isinstance(disposal['When'], datetime.datetime):
-                disposal['When'] = disposal['When'].isoformat()
-            if '_id' in disposal:
-                disposal['_id'] = str(disposal['_id'])
-            result.append(disposal)
-            
-        return jsonify(result), 200
+        return list_response(disposal_list_collection, location_query())
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Add new disposal record
 @app.route('/api/disposals/add', methods=['POST'])
 @token_required
+@idempotent
 def add_disposal(current_user):
     try:
         data = request.get_json() or {}
-
-        location = data.get('Location')
-        old_asset_code = data.get('Old Asset Code')
-        sn = data.get('SN')
-        details = data.get('Details')
-        reason_base = data.get('reasonBase')  # 'Scrapped' | 'Sold to Third Party' | 'Trade in'
-        vendor = data.get('Vendor') or ''
-        when_date = data.get('whenDate')  # 'YYYY-MM-DD'
-
-        if not location or not old_asset_code or not reason_base:
-            return jsonify({'message': 'Location, Old Asset Code, and reason are required!'}), 400
-
-        if reason_base in ['Sold to Third Party', 'Trade in'] and not vendor:
-            return jsonify({'message': 'Vendor is required for selected reason!'}), 400
-
-        if reason_base == 'Sold to Third Party':
-            reason = f"Sold To {vendor}"
-        elif reason_base == 'Trade in':
-            reason = f"Trade in to {vendor}"
-        else:
-            reason = 'Scrapped'
-
-        # Determine When (GMT+8)
-        if when_date:
-            try:
-                base_dt = datetime.datetime.strptime(when_date, '%Y-%m-%d')
-                when_dt = base_dt + datetime.timedelta(hours=8)
-            except Exception:
-                when_dt = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-        else:
-            when_dt = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-
-        doc = {
-            'Location': location,
-            'Old Asset Code': old_asset_code,
-            'SN': sn or '',
-            'Details': details or '',
-            'Reason': reason,
-            'When': when_dt,
-            'operator': current_user.get('userName', '')
-        }
+        try:
+            doc = new_disposal_doc(data, current_user)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
         result = disposal_list_collection.insert_one(doc)
 
         # Prepare output with ISO string for When
-        output = {**doc, '_id': str(result.inserted_id)}
-        if isinstance(output['When'], datetime.datetime):
-            output['When'] = output['When'].isoformat()
+        output = {**clean(doc), '_id': str(result.inserted_id)}
 
         # Write log: add
-        try:
-            logs_collection.insert_one({
-                'Action': 'add',
-                'operator': current_user.get('userName', ''),
-                'Before': {},
-                'After': {k: v for k, v in output.items() if k != '_id'},
-                'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-                'targetType': 'disposal',
-                'targetId': output.get('_id')
-            })
-        except Exception:
-            pass
-        return jsonify({'message': 'Disposal added successfully', 'item': output}), 201
+        audit_log.write(log_entry('add', current_user, {}, clean(output), 'disposal', output.get('_id')))
+        record_stats(stats_changes('disposals', None, doc))
+        return json_response({'message': 'Disposal added successfully', 'item': output}, 201)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Update asset
 @app.route('/api/assets/update', methods=['POST'])
 @token_required
+@idempotent
 def update_asset(current_user):
     try:
         data = request.get_json() or {}
@@ -518,66 +1344,38 @@ def update_asset(current_user):
         after = data.get('After') or {}
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = asset_list_collection.find_one({'_id': ObjectId(item_id)})
-        if not before_doc:
-            return jsonify({'message': 'Asset not found'}), 404
         # Do not allow editing Tag via this endpoint; operator always set to current user
         after.pop('Tag', None)
         # Ensure legacy field is not reintroduced
         after.pop('New Asset Code', None)
         after['operator'] = current_user.get('userName', '')
-        # Update document
-        asset_list_collection.update_one({'_id': ObjectId(item_id)}, {'$set': after})
-        updated = asset_list_collection.find_one({'_id': ObjectId(item_id)})
-        # Serialize datetime and _id
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'edit',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': clean(updated),
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'asset',
-            'targetId': item_id
-        })
-        updated['_id'] = str(updated['_id'])
-        if 'When' in updated and isinstance(updated['When'], datetime.datetime):
-            updated['When'] = updated['When'].isoformat()
-        return jsonify({'message': 'Asset updated successfully', 'item': updated}), 200
+        # Update document; the after-image is computed from the returned before-image
+        before_doc, updated = update_row(asset_list_collection, item_id, client_fields(after))
+        if not before_doc:
+            return missing_row(asset_list_collection, item_id, 'Asset not found')
+        audit_log.write(log_entry('edit', current_user, clean(before_doc), clean(updated), 'asset', item_id))
+        record_stats(stats_changes('assets', before_doc, updated))
+        record_tombstones(moved_away('asset_list', before_doc, updated))
+        return versioned_response({'message': 'Asset updated successfully', 'item': updated}, updated)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Delete asset
 @app.route('/api/assets/delete', methods=['POST'])
 @token_required
+@idempotent
 def delete_asset(current_user):
     try:
         data = request.get_json() or {}
         item_id = data.get('id')
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = asset_list_collection.find_one({'_id': ObjectId(item_id)})
+        before_doc = asset_list_collection.find_one_and_delete(row_filter(item_id))
         if not before_doc:
-            return jsonify({'message': 'Asset not found'}), 404
-        asset_list_collection.delete_one({'_id': ObjectId(item_id)})
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'delete',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': {},
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'asset',
-            'targetId': item_id
-        })
+            return missing_row(asset_list_collection, item_id, 'Asset not found')
+        audit_log.write(log_entry('delete', current_user, clean(before_doc), {}, 'asset', item_id))
+        record_stats(stats_changes('assets', before_doc, None))
+        record_tombstones([('asset_list', before_doc['_id'], before_doc.get('Location'))])
         return jsonify({'message': 'Asset deleted successfully'}), 200
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
@@ -585,6 +1383,7 @@ def delete_asset(current_user):
 # Update disposal
 @app.route('/api/disposals/update', methods=['POST'])
 @token_required
+@idempotent
 def update_disposal(current_user):
     try:
         data = request.get_json() or {}
@@ -592,66 +1391,189 @@ def update_disposal(current_user):
         after = data.get('After') or {}
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = disposal_list_collection.find_one({'_id': ObjectId(item_id)})
-        if not before_doc:
-            return jsonify({'message': 'Disposal not found'}), 404
         after['operator'] = current_user.get('userName', '')
-        disposal_list_collection.update_one({'_id': ObjectId(item_id)}, {'$set': after})
-        updated = disposal_list_collection.find_one({'_id': ObjectId(item_id)})
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'edit',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': clean(updated),
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'disposal',
-            'targetId': item_id
-        })
-        updated['_id'] = str(updated['_id'])
-        if 'When' in updated and isinstance(updated['When'], datetime.datetime):
-            updated['When'] = updated['When'].isoformat()
-        return jsonify({'message': 'Disposal updated successfully', 'item': updated}), 200
+        before_doc, updated = update_row(disposal_list_collection, item_id, client_fields(after))
+        if not before_doc:
+            return missing_row(disposal_list_collection, item_id, 'Disposal not found')
+        audit_log.write(log_entry('edit', current_user, clean(before_doc), clean(updated), 'disposal', item_id))
+        record_stats(stats_changes('disposals', before_doc, updated))
+        record_tombstones(moved_away('disposal_list', before_doc, updated))
+        return versioned_response({'message': 'Disposal updated successfully', 'item': updated}, updated)
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
 # Delete disposal
 @app.route('/api/disposals/delete', methods=['POST'])
 @token_required
+@idempotent
 def delete_disposal(current_user):
     try:
         data = request.get_json() or {}
         item_id = data.get('id')
         if not item_id:
             return jsonify({'message': 'id is required'}), 400
-        before_doc = disposal_list_collection.find_one({'_id': ObjectId(item_id)})
+        before_doc = disposal_list_collection.find_one_and_delete(row_filter(item_id))
         if not before_doc:
-            return jsonify({'message': 'Disposal not found'}), 404
-        disposal_list_collection.delete_one({'_id': ObjectId(item_id)})
-        def clean(doc):
-            c = {k: v for k, v in doc.items() if k != '_id'}
-            if 'When' in c and isinstance(c['When'], datetime.datetime):
-                c['When'] = c['When'].isoformat()
-            return c
-        logs_collection.insert_one({
-            'Action': 'delete',
-            'operator': current_user.get('userName', ''),
-            'Before': clean(before_doc),
-            'After': {},
-            'time': (datetime.datetime.utcnow() + datetime.timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S'),
-            'targetType': 'disposal',
-            'targetId': item_id
-        })
+            return missing_row(disposal_list_collection, item_id, 'Disposal not found')
+        audit_log.write(log_entry('delete', current_user, clean(before_doc), {}, 'disposal', item_id))
+        record_stats(stats_changes('disposals', before_doc, None))
+        record_tombstones([('disposal_list', before_doc['_id'], before_doc.get('Location'))])
         return jsonify({'message': 'Disposal deleted successfully'}), 200
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
+# Rows of a bulk request: a JSON array (or {"items": [...]}), a text/csv body or an uploaded CSV file
+def bulk_rows():
+    if 'file' in request.files:
+        text = request.files['file'].read().decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(text)))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError('Expected a JSON array of objects or CSV')
+    return data
+
+# Validate all rows, insert the valid ones with one unordered insert_many and
+# write their add logs in one batch. Returns (inserted docs, per-row results).
+def bulk_insert(collection, build_doc, target_type, current_user, rows):
+    results = [None] * len(rows)
+    docs = []
+    positions = []
+    for i, row in enumerate(rows):
+        try:
+            docs.append(build_doc(row, current_user))
+            positions.append(i)
+        except ValueError as e:
+            results[i] = {'row': i, 'status': 'invalid', 'message': str(e)}
+
+    write_errors = {}
+    if docs:
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get('writeErrors', []):
+                write_errors[err['index']] = err.get('errmsg', 'write failed')
+
+    inserted = []
+    for j, (i, doc) in enumerate(zip(positions, docs)):
+        if j in write_errors:
+            results[i] = {'row': i, 'status': 'error', 'message': write_errors[j]}
+        else:
+            results[i] = {'row': i, 'status': 'created', '_id': str(doc['_id'])}
+            inserted.append(doc)
+
+    audit_log.write_many(
+        log_entry('add', current_user, {}, clean(doc), target_type, str(doc['_id'])) for doc in inserted
+    )
+    record_stats([change for doc in inserted for change in stats_changes(target_type + 's', None, doc)])
+    return inserted, results
+
+def bulk_response(inserted, results):
+    return json_response({
+        'inserted': len(inserted),
+        'failed': len(results) - len(inserted),
+        'results': results
+    })
+
+def bulk_handler(collection, build_doc, target_type, current_user, after_insert=None):
+    try:
+        rows = bulk_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'message': str(e)}), 400
+    if not rows:
+        return jsonify({'message': 'No rows to import'}), 400
+    if len(rows) > BULK_MAX_ROWS:
+        return jsonify({'message': f'At most {BULK_MAX_ROWS} rows per request'}), 400
+    inserted, results = bulk_insert(collection, build_doc, target_type, current_user, rows)
+    if after_insert and inserted:
+        after_insert(inserted, current_user, results)
+    return bulk_response(inserted, results)
+
+# Bulk add assets
+@app.route('/api/assets/bulk', methods=['POST'])
+@token_required
+@idempotent
+def bulk_add_assets(current_user):
+    try:
+        return bulk_handler(asset_list_collection, new_asset_doc, 'asset', current_user)
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+# Move each transferred asset once, to its latest transfer in the batch, and report per
+# transfer row whether its asset was found (assetFound) and moved (assetMoveError if not)
+def apply_bulk_transfers(transfers, current_user, results):
+    latest = {}
+    for doc in transfers:
+        code = doc['Old Asset Code']
+        if code not in latest or doc['When'] >= latest[code]['When']:
+            latest[code] = doc
+    codes = list(latest)
+    failed = {}
+    before = {}
+    try:
+        # Current locations first, so the per-park asset counts can follow the moves
+        before = {
+            asset['Old Asset Code']: asset
+            for asset in asset_list_collection.find({'Old Asset Code': {'$in': codes}}, {'Old Asset Code': 1, 'Location': 1})
+        }
+        asset_list_collection.bulk_write(
+            [UpdateOne({'Old Asset Code': code}, asset_move(latest[code]['To'], latest[code]['When'], current_user)) for code in codes],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            failed[codes[err['index']]] = err.get('errmsg', 'write failed')
+    except Exception as e:
+        failed = {code: str(e) for code in codes}
+    if failed:
+        print(f"Bulk transfer asset moves failed for {len(failed)} of {len(codes)} assets: {next(iter(failed.values()))}")
+
+    moved = {code: asset for code, asset in before.items() if code not in failed}
+    record_stats([
+        change for code, asset in moved.items()
+        for change in stats_changes('assets', asset, {'Location': latest[code]['To']})
+    ])
+    record_tombstones([
+        entry for code, asset in moved.items()
+        for entry in moved_away('asset_list', asset, {'Location': latest[code]['To']})
+    ])
+
+    by_id = {result['_id']: result for result in results if result and result.get('status') == 'created'}
+    for doc in transfers:
+        result = by_id.get(str(doc['_id']))
+        if result is None:
+            continue
+        code = doc['Old Asset Code']
+        result['assetFound'] = code in before
+        if code in failed:
+            result['assetMoveError'] = failed[code]
+
+# Bulk add transfers
+@app.route('/api/transfers/bulk', methods=['POST'])
+@token_required
+@idempotent
+def bulk_add_transfers(current_user):
+    try:
+        return bulk_handler(transfer_list_collection, new_transfer_doc, 'transfer', current_user, apply_bulk_transfers)
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
+# Bulk add disposals
+@app.route('/api/disposals/bulk', methods=['POST'])
+@token_required
+@idempotent
+def bulk_add_disposals(current_user):
+    try:
+        return bulk_handler(disposal_list_collection, new_disposal_doc, 'disposal', current_user)
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+
 if __name__ == '__main__':
+    # Development server only; production runs gunicorn (SERVER_MODE=production, see gunicorn.conf.py)
     # Allow overriding port via environment; default to 5174 per deployment plan
     port = int(os.environ.get('PORT', 5174))
     print(f"Starting backend server on port {port}...")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
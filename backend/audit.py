@@ -0,0 +1,244 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from serialization import dumps
+
+DUPLICATE_KEY = 11000
+_CLAIMED = re.compile(r'\.replay-(\d+)$')
+
+
+class AuditLogWriter:
+    """Queue audit log entries and insert them in batches from a background thread.
+
+    Entries are flushed with insert_many when ``batch_size`` entries are waiting
+    or ``flush_interval`` seconds have passed. When the queue is full, write()
+    blocks for up to ``enqueue_timeout`` seconds (backpressure) and then spills
+    the entry to a local JSON-lines file. Batches that cannot be inserted are
+    spilled too, and spill files are replayed after the next successful flush.
+    Entries get their _id before the first attempt and keep it when spilled, so
+    a retry of an insert that did go through is a duplicate key, not a second copy.
+    """
+
+    def __init__(self, collection, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 enqueue_timeout=0.5, spill_dir='audit_spill'):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.spill_dir = spill_dir
+        self.written = 0
+        self.spilled = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _ensure_started(self):
+        # Started lazily so each gunicorn worker runs its own thread after fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, entry):
+        self._ensure_started()
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._spill([entry])
+
+    def write_many(self, entries):
+        for entry in entries:
+            self.write(entry)
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                if self._stop.is_set():
+                    # Shutting down: drain without waiting for the interval
+                    deadline = time.monotonic()
+            if batch:
+                try:
+                    self._flush(batch)
+                except Exception as e:
+                    # Keep the writer alive; claimed spill files are retried on the next flush
+                    print(f"Audit log writer error: {e}")
+
+    def _insert(self, entries):
+        """Insert entries; returns the ones to retry later (all of them if Mongo is unreachable)."""
+        for entry in entries:
+            entry.setdefault('_id', ObjectId())
+        try:
+            self.collection.insert_many(entries, ordered=False)
+            self.written += len(entries)
+            return []
+        except BulkWriteError as e:
+            # Everything without a write error was inserted; a duplicate key was inserted earlier
+            errors = [err for err in e.details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY]
+            self.written += len(entries) - len(errors)
+            if errors:
+                # Retrying would fail the same way; keep them aside for inspection
+                print(f"Audit log rejected {len(errors)} entries: {errors[0].get('errmsg')}")
+                self._write_lines(os.path.join(self.spill_dir, f"rejected-{os.getpid()}.jsonl"),
+                                  [entries[err['index']] for err in errors])
+            return []
+        except Exception as e:
+            print(f"Audit log insert failed, spilling {len(entries)} entries: {e}")
+            return entries
+
+    def _flush(self, batch):
+        retry = self._insert(batch)
+        if retry:
+            self._spill(retry)
+            return
+        self._replay_spill()
+
+    def _spill_path(self):
+        return os.path.join(self.spill_dir, f"audit-{os.getpid()}.jsonl")
+
+    def _write_lines(self, path, entries):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        while True:
+            with open(path, 'ab') as f:
+                # Exclusive lock so a replay never reads a half-written line
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    st = None
+                if st is None or st.st_ino != os.fstat(f.fileno()).st_ino:
+                    # Claimed for replay between open and lock; write to a fresh file
+                    continue
+                f.write(b''.join(dumps(entry) + b'\n' for entry in entries))
+                return
+
+    def _spill(self, entries):
+        with self._spill_lock:
+            self._write_lines(self._spill_path(), entries)
+            self.spilled += len(entries)
+
+    def _claim_spill_files(self):
+        # Rename first so only one process replays a given file; files left claimed by a
+        # process that has since died (or by an earlier failed replay here) are taken over
+        claimed = []
+        paths = glob.glob(os.path.join(self.spill_dir, 'audit-*.jsonl'))
+        for path in glob.glob(os.path.join(self.spill_dir, 'audit-*.jsonl.replay-*')):
+            pid = int(_CLAIMED.search(path).group(1))
+            if pid == os.getpid() or not _process_alive(pid):
+                paths.append(path)
+        for path in paths:
+            target = f"{_CLAIMED.sub('', path)}.replay-{os.getpid()}"
+            try:
+                os.rename(path, target)
+                claimed.append(target)
+            except OSError:
+                continue
+        return claimed
+
+    def _replay_spill(self):
+        for path in self._claim_spill_files():
+            entries = []
+            with open(path, 'rb') as f:
+                # Waits for a writer that opened the file before it was renamed
+                fcntl.flock(f, fcntl.LOCK_EX)
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError as e:
+                        print(f"Skipping unreadable audit spill line in {path}: {e}")
+                        continue
+                    if isinstance(entry.get('_id'), str) and ObjectId.is_valid(entry['_id']):
+                        entry['_id'] = ObjectId(entry['_id'])
+                    entries.append(entry)
+            retry = self._insert(entries) if entries else []
+            if retry:
+                # Back into this process's live spill file, after anything spilled meanwhile
+                self._spill(retry)
+            os.remove(path)
+
+    def close(self, timeout=10):
+        """Flush everything still queued and stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'spilled': self.spilled
+        }
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SyncAuditLogWriter:
+    """Insert each entry on the request path (AUDIT_ASYNC=0); failures never fail the request."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def write(self, entry):
+        try:
+            self.collection.insert_one(entry)
+        except Exception as e:
+            print(f"Audit log write failed: {e}")
+
+    def write_many(self, entries):
+        try:
+            self.collection.insert_many(list(entries), ordered=False)
+        except Exception as e:
+            print(f"Audit log write failed: {e}")
+
+    def close(self, timeout=None):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def create_audit_writer(collection):
+    if os.environ.get('AUDIT_ASYNC', '1') != '1':
+        return SyncAuditLogWriter(collection)
+    writer = AuditLogWriter(
+        collection,
+        max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+        batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0)),
+        spill_dir=os.environ.get('AUDIT_SPILL_DIR', 'audit_spill')
+    )
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,430 @@
+# Load test: seeds a throwaway database and runs concurrent simulated users against the app.
+#   python benchmark.py --mongomock --rows 10000 --clients 8 --duration 30
+#   python benchmark.py --mongo-uri mongodb://127.0.0.1:27017/ --rows 1000000 --url http://127.0.0.1:5174 \
+#       --server-pid <gunicorn pid> --output run.json
+#   python benchmark.py --no-seed --baseline run.json   # exit 1 if any p95 regressed
+# With --url, start the server with the same MONGO_URI, DATABASE_NAME (default pwasset_bench)
+# and raised LOGIN_* limits, or the login scenario will be throttled.
+# Seeding drops collections, so it refuses a non-local MONGO_URI unless --mongo-uri or
+# --i-know is given.
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Weighted request mix run by every client; see SCENARIOS below
+DEFAULT_MIX = ('assets=30,transfers=15,disposals=10,add=8,update=8,delete=5,'
+               'transfer_add=4,transfer_update=4,transfer_delete=2,'
+               'disposal_add=3,disposal_update=3,disposal_delete=2,login=5')
+BENCH_USER = 'bench'
+BENCH_PASSWORD = 'bench-password'
+SEED_BATCH = 10000
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '[::1]')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed a benchmark database and load-test the pwasset backend.')
+    parser.add_argument('--rows', type=int, default=10000, help='assets (and transfers) to seed; disposals get a tenth')
+    parser.add_argument('--parks', type=int, default=20, help='parks to spread rows over')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run the workload')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario weights, e.g. assets=50,add=50')
+    parser.add_argument('--page-size', type=int, default=100, help='limit used for list requests')
+    parser.add_argument('--database', default='pwasset_bench', help='database to seed (dropped first when seeding)')
+    parser.add_argument('--no-seed', action='store_true', help='reuse an already seeded database')
+    parser.add_argument('--mongomock', action='store_true', help='use an in-memory mongomock stand-in instead of MONGO_URI')
+    parser.add_argument('--mongo-uri', help='MongoDB to seed and (in-process) serve from, instead of MONGO_URI')
+    parser.add_argument('--i-know', action='store_true', help='allow seeding (dropping collections on) a non-local MONGO_URI')
+    parser.add_argument('--url', help='drive a running server (e.g. http://127.0.0.1:5174) instead of the app in-process')
+    parser.add_argument('--server-pid', type=int, help='with --url, also report the peak RSS of this process')
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--baseline', help='earlier JSON report; exit 1 if any p95 regressed by more than --max-regression')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='allowed relative p95 increase (default 0.2)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and request choice')
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    # Must run before db/app are imported: both read their settings at import time
+    os.environ['DATABASE_NAME'] = args.database
+    # One benchmark host logs in far more often than the login limits allow
+    for name in ('LOGIN_IP_PER_MINUTE', 'LOGIN_IP_BURST', 'LOGIN_USER_PER_MINUTE', 'LOGIN_USER_BURST'):
+        os.environ.setdefault(name, '1000000')
+    os.environ.setdefault('SLOW_REQUEST_MS', '0')
+    if args.mongo_uri:
+        os.environ['MONGO_URI'] = args.mongo_uri
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+
+
+def is_local_uri(uri):
+    if not uri.startswith('mongodb://'):
+        # mongodb+srv:// always names a remote cluster
+        return False
+    hosts = uri[len('mongodb://'):].split('/', 1)[0].rsplit('@', 1)[-1]
+    for host in hosts.split(','):
+        name = host.rsplit(':', 1)[0] if not host.endswith(']') else host
+        if name not in LOCAL_HOSTS:
+            return False
+    return True
+
+
+def check_seed_target(args):
+    """Refuse to drop and reseed a database that is not clearly a local test server."""
+    if args.mongomock or args.no_seed or args.mongo_uri or args.i_know:
+        return
+    from db import MONGO_URI
+    if not is_local_uri(MONGO_URI):
+        raise SystemExit(
+            f"Refusing to seed {MONGO_URI.rsplit('@', 1)[-1]}: seeding drops collections. "
+            'Point --mongo-uri at a local MongoDB, use --mongomock, or pass --i-know.'
+        )
+
+
+def seed(db, args, rng):
+    """Drop and refill the benchmark database with synthetic reference data and rows."""
+    from indexes import ensure_indexes
+    from passwords import hash_password
+
+    for name in ('users', 'areas', 'parks', 'asset_list', 'transfer_list', 'disposal_list',
+                 'logs', 'tombstones', 'stats_summary', 'cache_versions'):
+        db[name].drop()
+
+    areas = [{'areaId': f'A{i:02d}', 'code': f'A{i:02d}', 'name': f'Area {i}'} for i in range(max(1, args.parks // 5))]
+    parks = [
+        {'parkId': f'P{i:03d}', 'name': f'Park {i}', 'areaCode': areas[i % len(areas)]['code']}
+        for i in range(args.parks)
+    ]
+    db.areas.insert_many(areas)
+    db.parks.insert_many(parks)
+    db.users.insert_one({
+        'userId': BENCH_USER, 'password': hash_password(BENCH_PASSWORD), 'userName': 'Benchmark',
+        'userGroup': 'admin', 'parkIds': [park['parkId'] for park in parks]
+    })
+
+    start = datetime.datetime(2023, 1, 1)
+    park_area = {park['parkId']: park['areaCode'] for park in parks}
+
+    def rows(count, build):
+        batch = []
+        for i in range(count):
+            batch.append(build(i))
+            if len(batch) == SEED_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def when():
+        return start + datetime.timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60))
+
+    def asset(i):
+        location = parks[i % len(parks)]['parkId']
+        return {
+            'When': when(), 'Location': location, 'Area Code': park_area[location],
+            'Old Asset Code': f'BA{i:07d}', 'SN': f'SN{rng.randrange(10 ** 9):09d}',
+            'Details': f'Synthetic asset {i}', 'Tag': 'onsite', 'operator': 'Benchmark'
+        }
+
+    def transfer(i):
+        return {
+            'When': when(), 'Old Asset Code': f'BA{rng.randrange(args.rows):07d}',
+            'By': 'Benchmark', 'To': rng.choice(parks)['parkId'], 'Location': rng.choice(parks)['parkId'],
+            'Reason': 'Operation', 'operator': 'Benchmark'
+        }
+
+    def disposal(i):
+        return {
+            'When': when(), 'Location': rng.choice(parks)['parkId'], 'Old Asset Code': f'BD{i:07d}',
+            'SN': '', 'Details': f'Synthetic disposal {i}', 'Reason': 'Scrapped', 'operator': 'Benchmark'
+        }
+
+    for collection, count, build in ((db.asset_list, args.rows, asset),
+                                     (db.transfer_list, args.rows, transfer),
+                                     (db.disposal_list, max(1, args.rows // 10), disposal)):
+        for batch in rows(count, build):
+            collection.insert_many(batch, ordered=False)
+    ensure_indexes(db, log=lambda message: None)
+    return [park['parkId'] for park in parks]
+
+
+class InProcessClient:
+    """Flask test client for the app imported in this process."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self._client.open(path, method=method, json=body, headers=headers or {})
+        data = response.get_data()
+        return response.status_code, data
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=dict(headers or {}))
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class Session:
+    """One simulated user: logs in, pages through lists and edits rows it created."""
+
+    def __init__(self, client, parks, args, rng):
+        self.client = client
+        self.parks = parks
+        self.args = args
+        self.rng = rng
+        self.headers = {}
+        self.created = {'assets': [], 'transfers': [], 'disposals': []}
+        self.cursors = {}
+
+    def login(self):
+        status, data = self.client.request('POST', '/api/login', {'userId': BENCH_USER, 'password': BENCH_PASSWORD})
+        if status == 200:
+            self.headers = {'Authorization': 'Bearer ' + json.loads(data)['token']}
+        return status
+
+    def list_page(self, name):
+        locations = ','.join(self.rng.sample(self.parks, min(3, len(self.parks))))
+        path = f'/api/{name}?locations={locations}&limit={self.args.page_size}&view=table'
+        cursor = self.cursors.pop(name, None)
+        if cursor:
+            path += f'&cursor={cursor}'
+        status, data = self.client.request('GET', path, headers=self.headers)
+        if status == 200:
+            next_cursor = json.loads(data).get('nextCursor')
+            # Follow the next page half of the time, like a user scrolling
+            if next_cursor and self.rng.random() < 0.5:
+                self.cursors[name] = next_cursor
+        return status
+
+    def new_row(self, kind):
+        park = self.rng.choice(self.parks)
+        if kind == 'transfers':
+            # Moves one of the seeded assets
+            return {'Old Asset Code': f'BA{self.rng.randrange(max(1, self.args.rows)):07d}', 'To': park,
+                    'By': 'Benchmark', 'Reason': 'Operation'}
+        if kind == 'disposals':
+            return {'Location': park, 'Old Asset Code': f'BX{self.rng.randrange(10 ** 7):07d}',
+                    'Details': 'Benchmark disposal', 'reasonBase': 'Scrapped'}
+        return {'Location': park, 'Details': 'Benchmark asset', 'SN': f'BSN{self.rng.randrange(10 ** 9):09d}'}
+
+    def changed_fields(self, kind):
+        if kind == 'transfers':
+            return {'Reason': f'Operation {self.rng.randrange(1000)}'}
+        return {'Details': f'Benchmark {kind} {self.rng.randrange(1000)}'}
+
+    def add(self, kind='assets'):
+        status, data = self.client.request('POST', f'/api/{kind}/add', self.new_row(kind), self.headers)
+        if status == 201:
+            self.created[kind].append(json.loads(data)['item']['_id'])
+        return status
+
+    def update(self, kind='assets'):
+        if not self.created[kind]:
+            return self.add(kind)
+        item_id = self.rng.choice(self.created[kind])
+        return self.client.request('POST', f'/api/{kind}/update', {
+            'id': item_id, 'After': self.changed_fields(kind)
+        }, self.headers)[0]
+
+    def delete(self, kind='assets'):
+        if not self.created[kind]:
+            return self.add(kind)
+        item_id = self.created[kind].pop(self.rng.randrange(len(self.created[kind])))
+        return self.client.request('POST', f'/api/{kind}/delete', {'id': item_id}, self.headers)[0]
+
+
+SCENARIOS = {
+    'assets': lambda session: session.list_page('assets'),
+    'transfers': lambda session: session.list_page('transfers'),
+    'disposals': lambda session: session.list_page('disposals'),
+    'add': Session.add,
+    'update': Session.update,
+    'delete': Session.delete,
+    'transfer_add': lambda session: session.add('transfers'),
+    'transfer_update': lambda session: session.update('transfers'),
+    'transfer_delete': lambda session: session.delete('transfers'),
+    'disposal_add': lambda session: session.add('disposals'),
+    'disposal_update': lambda session: session.update('disposals'),
+    'disposal_delete': lambda session: session.delete('disposals'),
+    'login': Session.login,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}'; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_client(make_client, parks, args, mix, seed_value, deadline, results, lock):
+    rng = random.Random(seed_value)
+    session = Session(make_client(), parks, args, rng)
+    session.login()
+    names, weights = list(mix), list(mix.values())
+    samples = []
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = SCENARIOS[name](session)
+        except Exception:
+            status = 0
+        samples.append((name, time.perf_counter() - started, status))
+    with lock:
+        results.extend(samples)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    def stats(group):
+        latencies = sorted(latency * 1000 for _, latency, _ in group)
+        errors = sum(1 for _, _, status in group if not 200 <= status < 300)
+        return {
+            'requests': len(group),
+            'errors': errors,
+            'throughput': round(len(group) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 0.50), 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95), 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99), 2) if latencies else None,
+            'max_ms': round(latencies[-1], 2) if latencies else None,
+        }
+
+    by_scenario = {}
+    for sample in samples:
+        by_scenario.setdefault(sample[0], []).append(sample)
+    return stats(samples), {name: stats(group) for name, group in sorted(by_scenario.items())}
+
+
+def peak_rss_kb(pid=None):
+    if pid is None:
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def regressions(report, baseline, max_regression):
+    found = []
+    for name, current in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or not before.get('p95_ms') or current['p95_ms'] is None:
+            continue
+        change = current['p95_ms'] / before['p95_ms'] - 1
+        if change > max_regression:
+            found.append({'scenario': name, 'baseline_p95_ms': before['p95_ms'],
+                          'p95_ms': current['p95_ms'], 'change': round(change, 3)})
+    return found
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    check_seed_target(args)
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+
+    if args.url:
+        from db import create_client, get_database
+        db = get_database(create_client())
+        make_client = lambda: HttpClient(args.url)
+    else:
+        import app as backend
+        db = backend.db
+        make_client = lambda: InProcessClient(backend.app)
+
+    seed_started = time.perf_counter()
+    if args.no_seed:
+        parks = [park['parkId'] for park in db.parks.find({}, {'parkId': 1})]
+    else:
+        parks = seed(db, args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    results = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_client, args=(make_client, parks, args, mix, args.seed + i, deadline, results, lock))
+        for i in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    total, scenarios = summarize(results, elapsed)
+    report = {
+        'config': {
+            'rows': args.rows, 'parks': args.parks, 'clients': args.clients, 'duration': args.duration,
+            'mix': mix, 'page_size': args.page_size, 'target': args.url or 'in-process',
+            'database': 'mongomock' if args.mongomock else args.database
+        },
+        'seed_seconds': None if args.no_seed else round(seed_seconds, 2),
+        'elapsed_seconds': round(elapsed, 2),
+        'total': total,
+        'scenarios': scenarios,
+        'peak_rss_kb': {
+            'benchmark': peak_rss_kb(),
+            'server': peak_rss_kb(args.server_pid) if args.url and args.server_pid else None
+        },
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = regressions(report, json.load(f), args.max_regression)
+        exit_code = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+    if not args.url:
+        # Let queued audit logs drain before the interpreter exits
+        backend.audit_log.close()
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
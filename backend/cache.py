@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Collection holding one version counter per cached data set, e.g. {'_id': 'users', 'version': 3}.
+# Writers outside the backend process (the maintenance scripts) bump it so every
+# backend process drops its copy on the next version check.
+CACHE_VERSIONS_COLLECTION = 'cache_versions'
+
+
+def bump_version(db, name):
+    """Mark the cached data set ``name`` as changed for all backend processes."""
+    db[CACHE_VERSIONS_COLLECTION].update_one({'_id': name}, {'$inc': {'version': 1}}, upsert=True)
+
+
+def read_version(db, name):
+    doc = db[CACHE_VERSIONS_COLLECTION].find_one({'_id': name})
+    return doc.get('version', 0) if doc else 0
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    If ``version_fn`` is given it is polled at most every ``check_interval``
+    seconds and the whole cache is cleared when the returned value changes.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, version_fn=None, check_interval=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = float('-inf')
+
+    def _check_version(self, now):
+        if self.version_fn is None:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        # Query outside the lock so other threads keep reading meanwhile
+        try:
+            version = self.version_fn()
+        except Exception:
+            # Keep serving cached entries (bounded by ttl) if the check fails
+            return
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._data.clear()
+
+    def get(self, key):
+        now = time.monotonic()
+        self._check_version(now)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when ``key`` is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'maxsize': self.maxsize
+            }
@@ -1,10 +1,6 @@
-import pymongo
+from db import create_client, get_database
 from datetime import datetime, timedelta
 
-# Database connection details (same as app.py)
-MONGO_URI = "mongodb://094510.xyz:8827/"
-DATABASE_NAME = "pwasset"
-
 FIELDS_TO_UNSET = {
     'From': "",
     'To': "",
@@ -13,8 +9,8 @@ FIELDS_TO_UNSET = {
 }
 
 def main():
-    client = pymongo.MongoClient(MONGO_URI)
-    db = client[DATABASE_NAME]
+    client = create_client()
+    db = get_database(client)
     col = db.asset_list
     try:
         # Remove legacy fields across all documents
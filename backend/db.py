@@ -0,0 +1,65 @@
+import importlib.util
+import os
+
+import pymongo
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+
+# Database connection details shared by app.py and the maintenance scripts
+MONGO_URI = os.environ.get('MONGO_URI', "mongodb://094510.xyz:8827/")
+DATABASE_NAME = os.environ.get('DATABASE_NAME', "pwasset")
+
+# Pool sizes are per process (each gunicorn worker has its own client). A few
+# warm connections avoid paying the cross-host TCP/auth handshake on first use.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 2))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000))
+# Fail fast when no server is reachable instead of holding request threads for 30s
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+# Wire compression in preference order; ones whose package is missing are skipped
+# (zstd needs zstandard, snappy needs python-snappy, zlib is always available)
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib')
+# Read preference for the list endpoints. With a replica set these reads may lag
+# the primary slightly; writes and the reads that follow them stay on the primary.
+MONGO_LIST_READ_PREFERENCE = os.environ.get('MONGO_LIST_READ_PREFERENCE', 'secondaryPreferred')
+
+COMPRESSOR_PACKAGES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+
+def available_compressors():
+    names = [name.strip() for name in MONGO_COMPRESSORS.split(',') if name.strip()]
+    return [
+        name for name in names
+        if name in COMPRESSOR_PACKAGES and importlib.util.find_spec(COMPRESSOR_PACKAGES[name]) is not None
+    ]
+
+
+def create_client(**overrides):
+    """MongoClient configured from the MONGO_* environment variables; keyword arguments win."""
+    options = {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+        'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+        'appname': 'pwasset',
+    }
+    compressors = available_compressors()
+    if compressors:
+        options['compressors'] = ','.join(compressors)
+    options.update(overrides)
+    return pymongo.MongoClient(MONGO_URI, **options)
+
+
+def get_database(client):
+    return client[DATABASE_NAME]
+
+
+LIST_READ_PREFERENCE = make_read_preference(read_pref_mode_from_name(MONGO_LIST_READ_PREFERENCE), None)
+
+
+def for_lists(collection):
+    """The collection with the list endpoints' read preference applied."""
+    return collection.with_options(read_preference=LIST_READ_PREFERENCE)
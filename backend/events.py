@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+
+from pymongo.errors import ConnectionFailure
+
+# Collections whose changes are pushed, by the name used in events
+WATCHED = {
+    'asset_list': 'assets',
+    'transfer_list': 'transfers',
+    'disposal_list': 'disposals',
+}
+TOMBSTONES = 'tombstones'
+
+
+class Subscriber:
+    def __init__(self, locations, max_queue=100):
+        self.locations = set(locations)
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Set when events were dropped; the client should resync instead
+        self.overflowed = False
+
+
+class ChangeHub:
+    """One watcher per process fanning out location-scoped change events to SSE subscribers.
+
+    Events come from a MongoDB change stream on the list collections and
+    tombstones. Servers without change streams (standalone mongod) are polled
+    instead, using the updatedAt/deletedAt stamps written by the handlers.
+    Events are small notifications: {type, collection, id, Location, version}.
+    If the watcher fails (network error, failover) it retries with backoff and,
+    once running again, tells every subscriber to resync for what it missed.
+    """
+
+    def __init__(self, db, poll_interval=2.0, retry_max=30.0, max_subscribers=None):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.retry_max = retry_max
+        self.max_subscribers = max_subscribers
+        self.mode = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._failed = False
+
+    def subscribe(self, locations):
+        """A new Subscriber, or None when max_subscribers are already connected."""
+        subscriber = Subscriber(locations)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+            # Started lazily so each gunicorn worker runs its own watcher after fork
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='change-hub', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if event.get('Location') not in subscriber.locations:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except queue.Full:
+                subscriber.overflowed = True
+
+    def resync_all(self):
+        # Subscribers see this as an overflow and send the client a resync
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.overflowed = True
+
+    def _running(self):
+        # Called once the watcher is up; after a failure, events may have been missed
+        if self._failed:
+            self._failed = False
+            self._delay = 1.0
+            self.resync_all()
+
+    def _run(self):
+        use_stream = True
+        self._delay = 1.0
+        while True:
+            try:
+                if use_stream:
+                    self._watch()
+                else:
+                    self._poll()
+            except Exception as e:
+                if use_stream and self.mode != 'change_stream' and not isinstance(e, ConnectionFailure):
+                    # Change streams need a replica set; fall back to polling
+                    print(f"Change stream unavailable, polling instead: {e}")
+                    use_stream = False
+                    continue
+                print(f"Change watcher failed, retrying in {self._delay:.0f}s: {e}")
+                self._failed = True
+                time.sleep(self._delay)
+                self._delay = min(self._delay * 2, self.retry_max)
+
+    def _watch(self):
+        pipeline = [
+            {'$match': {
+                'ns.coll': {'$in': list(WATCHED) + [TOMBSTONES]},
+                'operationType': {'$in': ['insert', 'update', 'replace']}
+            }},
+            {'$project': {
+                'ns': 1, 'documentKey': 1,
+                'fullDocument.Location': 1, 'fullDocument.version': 1,
+                'fullDocument.collection': 1, 'fullDocument.id': 1
+            }}
+        ]
+        with self.db.watch(pipeline, full_document='updateLookup') as stream:
+            self.mode = 'change_stream'
+            self._running()
+            for change in stream:
+                doc = change.get('fullDocument') or {}
+                if change['ns']['coll'] == TOMBSTONES:
+                    self.publish(self._delete_event(doc))
+                else:
+                    self.publish({
+                        'type': 'change',
+                        'collection': WATCHED[change['ns']['coll']],
+                        'id': str(change['documentKey']['_id']),
+                        'Location': doc.get('Location'),
+                        'version': doc.get('version')
+                    })
+
+    def _delete_event(self, tombstone):
+        return {
+            'type': 'delete',
+            'collection': WATCHED.get(tombstone.get('collection')),
+            'id': tombstone.get('id'),
+            'Location': tombstone.get('Location')
+        }
+
+    def _latest(self, collection, field):
+        doc = self.db[collection].find_one({field: {'$exists': True}}, {field: 1}, sort=[(field, -1)])
+        return doc[field] if doc else None
+
+    def _poll(self):
+        marks = {name: self._latest(name, 'updatedAt') for name in WATCHED}
+        marks[TOMBSTONES] = self._latest(TOMBSTONES, 'deletedAt')
+        self.mode = 'polling'
+        self._running()
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                if not self._subscribers:
+                    continue
+            for name, label in WATCHED.items():
+                query = {'updatedAt': {'$gt': marks[name]}} if marks[name] else {'updatedAt': {'$exists': True}}
+                for doc in self.db[name].find(query, {'Location': 1, 'version': 1, 'updatedAt': 1}).sort('updatedAt', 1):
+                    marks[name] = doc['updatedAt']
+                    self.publish({
+                        'type': 'change',
+                        'collection': label,
+                        'id': str(doc['_id']),
+                        'Location': doc.get('Location'),
+                        'version': doc.get('version')
+                    })
+            query = {'deletedAt': {'$gt': marks[TOMBSTONES]}} if marks[TOMBSTONES] else {}
+            for doc in self.db[TOMBSTONES].find(query).sort('deletedAt', 1):
+                marks[TOMBSTONES] = doc['deletedAt']
+                self.publish(self._delete_event(doc))
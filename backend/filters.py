@@ -0,0 +1,138 @@
+import datetime
+import re
+
+import pymongo
+
+# Fields the list endpoints may filter and sort on, per collection, with their type.
+# 'text' fields accept equality, comma-separated lists and prefix matches; 'date'
+# fields accept gte/gt/lte/lt ranges. Everything else is rejected.
+LIST_FIELDS = {
+    'asset_list': {
+        'When': 'date', 'Location': 'text', 'Area Code': 'text', 'Old Asset Code': 'text',
+        'SN': 'text', 'Details': 'text', 'Tag': 'text', 'operator': 'text'
+    },
+    'transfer_list': {
+        'When': 'date', 'Location': 'text', 'Old Asset Code': 'text', 'By': 'text',
+        'To': 'text', 'Reason': 'text', 'operator': 'text'
+    },
+    'disposal_list': {
+        'When': 'date', 'Location': 'text', 'Old Asset Code': 'text', 'SN': 'text',
+        'Details': 'text', 'Reason': 'text', 'operator': 'text'
+    },
+}
+TEXT_OPS = ('eq', 'in', 'prefix')
+DATE_OPS = ('eq', 'gte', 'gt', 'lte', 'lt')
+DEFAULT_SORT = [('When', pymongo.DESCENDING)]
+MAX_SORT_FIELDS = 3
+
+_FILTER_PARAM = re.compile(r'^filter\[([^\]]+)\](?:\[(\w+)\])?$')
+
+
+def _parse_date(value, op):
+    """A YYYY-MM-DD date covers the whole day; full ISO datetimes are taken as is."""
+    try:
+        if len(value) == 10:
+            day = datetime.datetime.strptime(value, '%Y-%m-%d')
+            # lte/gt a day means up to/after the end of that day
+            return day + datetime.timedelta(days=1) if op in ('lte', 'gt') else day
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+
+
+def _date_condition(op, value):
+    if op == 'eq':
+        start = _parse_date(value, 'gte')
+        if len(value) == 10:
+            return {'$gte': start, '$lt': start + datetime.timedelta(days=1)}
+        return start
+    bound = _parse_date(value, op)
+    # Whole-day bounds become half-open ranges on midnight
+    mongo_op = {'gte': '$gte', 'gt': '$gte', 'lte': '$lt', 'lt': '$lt'}[op] if len(value) == 10 else f'${op}'
+    return {mongo_op: bound}
+
+
+def parse_filters(args, collection_name):
+    """Mongo query for the filter[Field] / filter[Field][op] parameters in ``args``.
+
+    Examples: filter[Tag]=onsite, filter[Reason][prefix]=Oper,
+    filter[Location][in]=P1,P2, filter[When][gte]=2024-01-01.
+    Raises ValueError for unknown fields, operators or bad values.
+    """
+    fields = LIST_FIELDS.get(collection_name, {})
+    conditions = {}
+    for key in args:
+        match = _FILTER_PARAM.match(key)
+        if not match:
+            continue
+        field, op = match.group(1), match.group(2) or 'eq'
+        kind = fields.get(field)
+        if kind is None:
+            raise ValueError(f'Cannot filter on {field}')
+        if op not in (DATE_OPS if kind == 'date' else TEXT_OPS):
+            raise ValueError(f'Unsupported operator for {field}: {op}')
+        for value in args.getlist(key):
+            if kind == 'date':
+                condition = _date_condition(op, value)
+            elif op == 'prefix':
+                # Anchored, case-sensitive prefix so the field's index can be used
+                condition = {'$regex': '^' + re.escape(value)}
+            elif op == 'in' or (op == 'eq' and ',' in value):
+                condition = {'$in': [v for v in value.split(',') if v != '']}
+            else:
+                condition = value
+            conditions.setdefault(field, []).append(condition)
+
+    query = {}
+    extra = []
+    for field, conds in conditions.items():
+        if len(conds) == 1:
+            query[field] = conds[0]
+        else:
+            # e.g. filter[When][gte] together with filter[When][lte]
+            extra.extend({field: cond} for cond in conds)
+    if extra:
+        query['$and'] = extra
+    return query
+
+
+def parse_sort(value, collection_name):
+    """Sort spec from ?sort=-When,Location (a leading '-' is descending); DEFAULT_SORT when empty."""
+    if not value:
+        return list(DEFAULT_SORT)
+    fields = LIST_FIELDS.get(collection_name, {})
+    sort = []
+    for part in value.split(','):
+        part = part.strip()
+        direction = pymongo.DESCENDING if part.startswith('-') else pymongo.ASCENDING
+        field = part.lstrip('+-')
+        if field not in fields:
+            raise ValueError(f'Cannot sort on {field}')
+        if field in (f for f, _ in sort):
+            raise ValueError(f'{field} appears twice in sort')
+        sort.append((field, direction))
+    if len(sort) > MAX_SORT_FIELDS:
+        raise ValueError(f'At most {MAX_SORT_FIELDS} sort fields')
+    return sort
+
+
+def _after_value(field, direction, value):
+    # Mongo sorts missing/null first ascending and last descending
+    if direction == pymongo.ASCENDING:
+        return {field: {'$gt': value}} if value is not None else {field: {'$ne': None}}
+    if value is None:
+        return None
+    return {'$or': [{field: {'$lt': value}}, {field: None}]}
+
+
+def after_key(sort, values, last_id):
+    """Rows that come after the row with these sort ``values`` and ``last_id`` under ``sort`` + _id."""
+    keys = list(zip(sort, values)) + [(('_id', sort[0][1]), last_id)]
+    branches = []
+    for i, ((field, direction), value) in enumerate(keys):
+        after = _after_value(field, direction, value)
+        if after is None:
+            continue
+        ties = [{f: v} for (f, _), v in keys[:i]]
+        branches.append({'$and': ties + [after]} if ties else after)
+    return {'$or': branches}
@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+# Production serving settings (used by: gunicorn -c gunicorn.conf.py app:app)
+bind = f"0.0.0.0:{os.environ.get('PORT', 5174)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Each open /api/events stream holds one thread; app.py lets streams use at most
+# EVENTS_MAX_STREAMS (default half) of a worker's threads and answers 503 beyond that
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycle workers now and then to cap slow memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+accesslog = '-'
+errorlog = '-'
+
+# Do not preload: each worker imports app.py after fork, so every worker
+# builds its own MongoClient (pymongo clients are not fork-safe).
+preload_app = False
+
+
+def worker_exit(server, worker):
+    # Flush queued audit logs, then close the worker's MongoClient on graceful shutdown
+    try:
+        from app import audit_log, client
+        audit_log.close()
+        client.close()
+    except Exception:
+        pass
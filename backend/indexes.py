@@ -0,0 +1,158 @@
+import argparse
+import os
+import sys
+
+import pymongo
+from pymongo.errors import OperationFailure
+
+from db import create_client, get_database
+
+# Seconds tombstones are kept for /api/sync (app.py imports this)
+TOMBSTONE_TTL = int(os.environ.get('TOMBSTONE_TTL', 30 * 24 * 3600))
+# Seconds stored Idempotency-Key responses are kept
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 7 * 24 * 3600))
+
+# Declared indexes per collection: (name, keys, options)
+# - list endpoints filter Location with $in and sort When desc (_id breaks ties for keyset paging)
+# - add_transfer/update_transfer look up assets by Old Asset Code
+# - /api/search matches prefixes of searchKeys (codes and SN, see search.py) and words of Details
+#   ($text, no language so words are neither stemmed nor dropped as stop words)
+# - token_required looks up users by userId, add_asset looks up parks by parkId
+# - asset history looks up logs by Old Asset Code
+# - /api/sync reads rows by Location and updatedAt, and tombstones by deletedAt
+# - the /api/events polling fallback reads rows by updatedAt across all locations
+# - the list filters most used per tab: Tag on assets, Reason on transfers/disposals
+LIST_INDEXES = [
+    ('location_when', [('Location', pymongo.ASCENDING), ('When', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)], {}),
+    ('when', [('When', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)], {}),
+    ('old_asset_code', [('Old Asset Code', pymongo.ASCENDING)], {}),
+    ('sn', [('SN', pymongo.ASCENDING)], {}),
+    ('details', [('Details', pymongo.ASCENDING)], {}),
+    ('search_keys', [('searchKeys', pymongo.ASCENDING)], {}),
+    ('details_text', [('Details', pymongo.TEXT)], {'default_language': 'none'}),
+    ('location_updated', [('Location', pymongo.ASCENDING), ('updatedAt', pymongo.ASCENDING)], {}),
+    ('updated', [('updatedAt', pymongo.ASCENDING)], {}),
+]
+
+INDEXES = {
+    'asset_list': LIST_INDEXES + [
+        ('location_tag_when', [('Location', pymongo.ASCENDING), ('Tag', pymongo.ASCENDING), ('When', pymongo.DESCENDING)], {}),
+    ],
+    'transfer_list': LIST_INDEXES + [
+        ('location_reason_when', [('Location', pymongo.ASCENDING), ('Reason', pymongo.ASCENDING), ('When', pymongo.DESCENDING)], {}),
+    ],
+    'disposal_list': LIST_INDEXES + [
+        ('location_reason_when', [('Location', pymongo.ASCENDING), ('Reason', pymongo.ASCENDING), ('When', pymongo.DESCENDING)], {}),
+    ],
+    'users': [
+        ('userId_unique', [('userId', pymongo.ASCENDING)], {'unique': True}),
+    ],
+    'parks': [
+        ('parkId_unique', [('parkId', pymongo.ASCENDING)], {'unique': True}),
+    ],
+    # /api/assets/<code>/history finds log entries by the code in their snapshots
+    'logs': [
+        ('before_code', [('Before.Old Asset Code', pymongo.ASCENDING)], {}),
+        ('after_code', [('After.Old Asset Code', pymongo.ASCENDING)], {}),
+    ],
+    'tombstones': [
+        ('location_deleted', [('Location', pymongo.ASCENDING), ('deletedAt', pymongo.ASCENDING)], {}),
+        ('deleted_ttl', [('deletedAt', pymongo.ASCENDING)], {'expireAfterSeconds': TOMBSTONE_TTL}),
+    ],
+    # Tickets are only valid for EVENTS_TICKET_SECONDS; this just removes unused ones
+    'event_tickets': [
+        ('created_ttl', [('createdAt', pymongo.ASCENDING)], {'expireAfterSeconds': 3600}),
+    ],
+    'idempotency_keys': [
+        ('created_ttl', [('createdAt', pymongo.ASCENDING)], {'expireAfterSeconds': IDEMPOTENCY_TTL}),
+    ],
+}
+
+
+def _key_spec(keys):
+    return [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in keys]
+
+
+def existing_indexes(collection):
+    """Map index name -> key spec for the indexes present on a collection.
+
+    Text indexes are stored as _fts/_ftsx keys; they map back to their fields.
+    """
+    return {
+        name: [(field, pymongo.TEXT) for field in sorted(info['weights'])] if 'weights' in info else _key_spec(info['key'])
+        for name, info in collection.index_information().items()
+    }
+
+
+def ensure_indexes(db, log=print):
+    """Create any declared index that is missing. Safe to run repeatedly.
+
+    An index with the same keys under a different name counts as present.
+    Returns a list of (collection, index name, status) tuples.
+    """
+    results = []
+    for coll_name, declared in INDEXES.items():
+        collection = db[coll_name]
+        present = existing_indexes(collection)
+        for name, keys, options in declared:
+            if _key_spec(keys) in present.values():
+                results.append((coll_name, name, 'present'))
+                continue
+            try:
+                collection.create_index(keys, name=name, **options)
+                results.append((coll_name, name, 'created'))
+                log(f"Created index {coll_name}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicate userId values block a unique index
+                results.append((coll_name, name, 'failed'))
+                log(f"Could not create index {coll_name}.{name}: {e}")
+    return results
+
+
+def index_report(db):
+    """Report declared indexes that are missing, undeclared extras and unused ones.
+
+    Unused means zero accesses in $indexStats since the server last started.
+    """
+    report = {'missing': [], 'extra': [], 'unused': []}
+    for coll_name, declared in INDEXES.items():
+        collection = db[coll_name]
+        present = existing_indexes(collection)
+        declared_specs = [_key_spec(keys) for _, keys, _ in declared]
+        for name, keys, _ in declared:
+            if _key_spec(keys) not in present.values():
+                report['missing'].append(f"{coll_name}.{name}")
+        for name, spec in present.items():
+            if name != '_id_' and spec not in declared_specs:
+                report['extra'].append(f"{coll_name}.{name}")
+        try:
+            for stats in collection.aggregate([{'$indexStats': {}}]):
+                if stats['name'] != '_id_' and stats['accesses']['ops'] == 0:
+                    report['unused'].append(f"{coll_name}.{stats['name']}")
+        except Exception:
+            # $indexStats needs the clusterMonitor role; skip usage when unavailable
+            pass
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create and check pwasset MongoDB indexes.')
+    parser.add_argument('--check', action='store_true', help='only report, do not create indexes')
+    args = parser.parse_args()
+
+    client = create_client()
+    db = get_database(client)
+    try:
+        if not args.check:
+            ensure_indexes(db)
+        report = index_report(db)
+        for kind in ('missing', 'extra', 'unused'):
+            print(f"{kind.capitalize()} indexes: {', '.join(report[kind]) or 'none'}")
+        if report['missing']:
+            sys.exit(1)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import threading
+import time
+
+from flask import g, request
+from pymongo import monitoring
+
+# Requests slower than this many milliseconds are logged (0 disables the log)
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labels, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * len(self.buckets), 0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    out.append((f'{self.name}_bucket', self.labels + ('le',), key + (_number(bound),), bucket_count))
+                out.append((f'{self.name}_bucket', self.labels + ('le',), key + ('+Inf',), count))
+                out.append((f'{self.name}_sum', self.labels, key, total))
+                out.append((f'{self.name}_count', self.labels, key, count))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, label_names, label_values, value in samples:
+                lines.append(f'{name}{_label_text(label_names, label_values)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics are per process: with several gunicorn workers each scrape reads
+# whichever worker answered, so every series carries that worker's pid.
+registry = Registry()
+request_latency = registry.add(Histogram(
+    'pwasset_request_duration_seconds', 'Time until the response headers were ready, by route.',
+    ('method', 'route', 'status')))
+response_size = registry.add(Histogram(
+    'pwasset_response_size_bytes', 'Response body size as sent (after compression), by route.',
+    ('method', 'route'), buckets=SIZE_BUCKETS))
+slow_requests = registry.add(Counter(
+    'pwasset_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS, by route.', ('method', 'route')))
+mongo_latency = registry.add(Histogram(
+    'pwasset_mongo_command_duration_seconds', 'MongoDB command round trips, by command.', ('command',)))
+mongo_failures = registry.add(Counter(
+    'pwasset_mongo_command_failures_total', 'Failed MongoDB commands, by command.', ('command',)))
+pool_in_use = registry.add(Gauge(
+    'pwasset_mongo_pool_connections_in_use', 'Connections checked out of the pool, by server.', ('address',)))
+pool_open = registry.add(Gauge(
+    'pwasset_mongo_pool_connections_open', 'Open pool connections, by server.', ('address',)))
+pool_wait = registry.add(Histogram(
+    'pwasset_mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pool connection.', ('address',)))
+pool_checkout_failures = registry.add(Counter(
+    'pwasset_mongo_pool_checkout_failures_total', 'Connection checkouts that failed or timed out.', ('address',)))
+cache_requests = registry.add(Gauge(
+    'pwasset_cache_requests', 'In-process cache lookups since start, by cache and result.', ('cache', 'result')))
+cache_size = registry.add(Gauge(
+    'pwasset_cache_entries', 'Entries held by each in-process cache.', ('cache',)))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name)
+        mongo_failures.inc(event.command_name)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks open/in-use connections and checkout waits (timed per thread)."""
+
+    def __init__(self):
+        self._in_use = {}
+        self._open = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _adjust(self, counts, gauge, address, delta):
+        address = f'{address[0]}:{address[1]}'
+        with self._lock:
+            counts[address] = max(counts.get(address, 0) + delta, 0)
+            gauge.set(address, value=counts[address])
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._adjust(self._open, pool_open, event.address, 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust(self._open, pool_open, event.address, -1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_failures.inc(f'{event.address[0]}:{event.address[1]}')
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            pool_wait.observe(time.perf_counter() - started, f'{event.address[0]}:{event.address[1]}')
+            self._local.started = None
+        self._adjust(self._in_use, pool_in_use, event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._adjust(self._in_use, pool_in_use, event.address, -1)
+
+
+def mongo_listeners():
+    """Event listeners to pass to MongoClient(event_listeners=...)."""
+    return [CommandMetrics(), PoolMetrics()]
+
+
+def record_caches(caches):
+    """Copy hit/miss counts from TTLCache.stats() into the cache gauges; caches maps name -> cache."""
+    for name, cache in caches.items():
+        stats = cache.stats()
+        cache_requests.set(name, 'hit', value=stats['hits'])
+        cache_requests.set(name, 'miss', value=stats['misses'])
+        cache_size.set(name, value=stats['size'])
+
+
+def render_metrics():
+    text = registry.render()
+    # Same pid label on every sample so series from different workers stay apart
+    pid = os.getpid()
+    lines = []
+    for line in text.splitlines():
+        if line.startswith('#'):
+            lines.append(line)
+        elif '{' in line:
+            lines.append(line.replace('{', f'{{pid="{pid}",', 1))
+        else:
+            name, value = line.split(' ', 1)
+            lines.append(f'{name}{{pid="{pid}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_latency.observe(elapsed, request.method, route, str(response.status_code))
+    # Streamed bodies (NDJSON, CSV, SSE) have no length when the headers go out
+    if response.content_length is not None:
+        response_size.observe(response.content_length, request.method, route)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        slow_requests.inc(request.method, route)
+        print(f"Slow request: {request.method} {request.full_path.rstrip('?')} "
+              f"{response.status_code} {elapsed * 1000:.0f}ms")
+    return response
+
+
+def init_metrics(app):
+    """Time every request. Register before init_compression so sizes are measured as sent."""
+    if os.environ.get('METRICS', '1') == '1':
+        app.before_request(_start_timer)
+        app.after_request(_record_request)
@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import hmac
+import os
+
+# argon2 is optional; without argon2-cffi only scrypt is offered
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import InvalidHash, VerificationError
+except ImportError:
+    PasswordHasher = None
+
+# Scheme used for new hashes and for upgrading old ones on login: 'scrypt' or 'argon2'
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+# scrypt cost: n=2**14, r=8 uses 16 MiB and tens of milliseconds per check
+SCRYPT_N = int(os.environ.get('SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class ScryptHasher:
+    """Stored as scrypt$<n>$<r>$<p>$<salt>$<hash> (base64 without padding)."""
+    prefix = 'scrypt$'
+
+    def hash(self, password):
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+
+    def _derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r, dklen=32)
+
+    def verify(self, password, stored):
+        try:
+            _, n, r, p, salt, digest = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False, False
+        ok = hmac.compare_digest(self._derive(password, _unb64(salt), n, r, p), _unb64(digest))
+        return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+class Argon2Hasher:
+    """argon2id via argon2-cffi; stored in its own $argon2id$... format."""
+    prefix = '$argon2'
+
+    def __init__(self):
+        self._hasher = PasswordHasher()
+
+    def hash(self, password):
+        return self._hasher.hash(password)
+
+    def verify(self, password, stored):
+        try:
+            self._hasher.verify(stored, password)
+        except (VerificationError, InvalidHash):
+            return False, False
+        return True, self._hasher.check_needs_rehash(stored)
+
+
+class Md5Hasher:
+    """Legacy unsalted MD5 hex digests; only ever verified, never written."""
+    prefix = ''
+
+    def verify(self, password, stored):
+        ok = hmac.compare_digest(hashlib.md5(password.encode()).hexdigest(), stored)
+        return ok, ok
+
+
+HASHERS = {'scrypt': ScryptHasher()}
+if PasswordHasher is not None:
+    HASHERS['argon2'] = Argon2Hasher()
+if PASSWORD_HASHER not in HASHERS:
+    raise RuntimeError(f"PASSWORD_HASHER={PASSWORD_HASHER} is not available")
+
+
+def hash_password(password):
+    return HASHERS[PASSWORD_HASHER].hash(password)
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash of any supported scheme.
+
+    Returns (ok, needs_rehash); needs_rehash is True when the password matched
+    but was stored with another scheme or weaker parameters than configured.
+    """
+    if not isinstance(stored, str) or not stored:
+        return False, False
+    for name, hasher in HASHERS.items():
+        if stored.startswith(hasher.prefix):
+            ok, outdated = hasher.verify(password, stored)
+            return ok, ok and (outdated or name != PASSWORD_HASHER)
+    if stored.startswith('$argon2'):
+        # argon2 hash but argon2-cffi is not installed here
+        return False, False
+    return Md5Hasher().verify(password, stored)
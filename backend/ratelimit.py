@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets held in memory (per process), least recently used keys evicted.
+
+    Each key may spend up to ``burst`` tokens at once; tokens refill at
+    ``per_minute`` per minute. An evicted key simply starts again with a full
+    bucket, so ``maxsize`` only bounds memory.
+    """
+
+    def __init__(self, per_minute, burst, maxsize=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.maxsize = maxsize
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refill(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return tokens
+
+    def retry_after(self, key):
+        """Seconds until ``key`` has a token again; 0 if it has one now. Spends nothing."""
+        with self._lock:
+            tokens = self._refill(key, time.monotonic())
+            if tokens >= 1:
+                return 0
+            self.limited += 1
+            return (1 - tokens) / self.rate
+
+    def consume(self, key):
+        """Spend one token if available; returns the retry_after() value."""
+        with self._lock:
+            tokens = self._refill(key, time.monotonic())
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, self._buckets[key][1])
+                return 0
+            self.limited += 1
+            return (1 - tokens) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'limited': self.limited}
@@ -0,0 +1,73 @@
+import re
+
+from pymongo import UpdateOne
+
+from db import create_client, get_database
+
+# /api/search keys: every row stores the lowercased suffixes of its Old Asset Code
+# and SN in searchKeys, so an anchored prefix match on that (multikey) index is a
+# case-insensitive substring match on the code or SN ('abc9' finds 'AbC9',
+# '00123' finds 'PW-00123'). Details is matched by words through a $text index.
+SEARCH_KEYS_FIELD = 'searchKeys'
+SEARCH_KEY_SOURCES = ('Old Asset Code', 'SN')
+# Only this many characters of a code or SN are indexed
+SEARCH_KEY_MAX_LENGTH = 64
+# Projection that leaves the keys out of API responses
+HIDE_SEARCH_KEYS = {SEARCH_KEYS_FIELD: 0}
+COLLECTIONS = ('asset_list', 'transfer_list', 'disposal_list')
+BACKFILL_BATCH = 500
+
+
+def normalize(value):
+    return str(value if value is not None else '').strip().lower()[:SEARCH_KEY_MAX_LENGTH]
+
+
+def search_keys(doc):
+    keys = set()
+    for field in SEARCH_KEY_SOURCES:
+        value = normalize(doc.get(field))
+        keys.update(value[i:] for i in range(len(value)))
+    return sorted(keys)
+
+
+def keys_query(q):
+    """Rows whose Old Asset Code or SN contains q, ignoring case."""
+    return {SEARCH_KEYS_FIELD: re.compile('^' + re.escape(normalize(q)))}
+
+
+def text_query(q):
+    """Rows whose Details contain a word of q."""
+    return {'$text': {'$search': q}}
+
+
+def backfill(db):
+    """Set searchKeys on rows that were written before it existed or whose keys are stale."""
+    updated = 0
+    for name in COLLECTIONS:
+        collection = db[name]
+        ops = []
+        for doc in collection.find({}, {field: 1 for field in SEARCH_KEY_SOURCES + (SEARCH_KEYS_FIELD,)}):
+            keys = search_keys(doc)
+            if doc.get(SEARCH_KEYS_FIELD) != keys:
+                ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {SEARCH_KEYS_FIELD: keys}}))
+            if len(ops) >= BACKFILL_BATCH:
+                updated += collection.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += collection.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+def main():
+    client = create_client()
+    db = get_database(client)
+    try:
+        print(f"Updated search keys on {backfill(db)} rows.")
+    except Exception as e:
+        print(f"Error during search key backfill: {e}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
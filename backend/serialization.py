@@ -0,0 +1,47 @@
+import datetime
+import json
+
+from bson import ObjectId
+from flask import Response
+
+# orjson encodes datetimes and nested dicts/lists natively in C; fall back to
+# the stdlib encoder when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode Mongo documents (datetime, ObjectId, nested values) to JSON bytes in one pass."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(obj, status=200):
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def to_json_value(value):
+    """Return ``value`` with datetimes and ObjectIds converted to strings, recursively."""
+    if isinstance(value, dict):
+        return {k: to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if isinstance(value, (ObjectId, datetime.datetime, datetime.date)):
+        return _default(value)
+    return value
+
+
+def clean(doc):
+    """Copy of a document without _id and with JSON-safe values, as stored in audit logs."""
+    return {k: to_json_value(v) for k, v in doc.items() if k != '_id'}
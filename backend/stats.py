@@ -0,0 +1,167 @@
+import datetime
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from db import create_client, get_database
+
+# Materialized per-park summary, one document per Location:
+#   {'_id': <parkId>, 'assets': <count>, 'transfers': {'YYYY-MM': n}, 'disposals': {'YYYY-MM': n}}
+# plus a '_meta' document holding the time of the last full refresh and, while one runs,
+# the refresh lock (refreshingUntil).
+STATS_COLLECTION = 'stats_summary'
+META_ID = '_meta'
+# Months of transfer/disposal history covered by a full refresh
+STATS_MONTHS = int(os.environ.get('STATS_MONTHS', 12))
+# Seconds a refresh may hold the lock before another process can take it over
+STATS_REFRESH_LEASE = int(os.environ.get('STATS_REFRESH_LEASE', 600))
+
+
+def _now():
+    return datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+
+
+def month_key(when):
+    return when.strftime('%Y-%m') if isinstance(when, datetime.datetime) else None
+
+
+def _monthly_counts(collection, since):
+    pipeline = [
+        {'$match': {'When': {'$gte': since}}},
+        {'$group': {
+            '_id': {
+                'location': '$Location',
+                'month': {'$dateToString': {'format': '%Y-%m', 'date': '$When'}}
+            },
+            'count': {'$sum': 1}
+        }}
+    ]
+    counts = {}
+    for row in collection.aggregate(pipeline):
+        location = row['_id'].get('location')
+        if location:
+            counts.setdefault(location, {})[row['_id']['month']] = row['count']
+    return counts
+
+
+def _count_updates(location, stored, assets, transfers, disposals, since_key):
+    """Updates moving a stored park document to the recomputed counts.
+
+    Counts change by $inc rather than being replaced, so increments applied by
+    apply_stats_changes while the aggregations ran are kept. Months before the
+    window are dropped.
+    """
+    inc = {}
+    stale = {}
+    delta = assets.get(location, 0) - stored.get('assets', 0)
+    if delta:
+        inc['assets'] = delta
+    for kind, fresh in (('transfers', transfers), ('disposals', disposals)):
+        old = stored.get(kind) or {}
+        new = fresh.get(location, {})
+        for month in set(old) | set(new):
+            if month < since_key:
+                stale[f'{kind}.{month}'] = ''
+                continue
+            delta = new.get(month, 0) - old.get(month, 0)
+            if delta:
+                inc[f'{kind}.{month}'] = delta
+    ops = []
+    if inc:
+        ops.append(UpdateOne({'_id': location}, {'$inc': inc}, upsert=True))
+    if stale:
+        ops.append(UpdateOne({'_id': location}, {'$unset': stale}))
+    return ops
+
+
+def refresh_stats(db, now=None):
+    """Recompute the whole summary with aggregation pipelines and apply it.
+
+    Callers should hold the refresh lock (see refresh_stats_locked). A write whose
+    increment lands while the aggregations run may be counted twice until the
+    next refresh, but increments are never lost.
+    """
+    now = now or _now()
+    since = datetime.datetime(now.year, now.month, 1)
+    for _ in range(STATS_MONTHS - 1):
+        since = (since - datetime.timedelta(days=1)).replace(day=1)
+
+    summary = db[STATS_COLLECTION]
+    stored = {doc['_id']: doc for doc in summary.find({'_id': {'$ne': META_ID}})}
+    assets = {
+        row['_id']: row['count']
+        for row in db.asset_list.aggregate([{'$group': {'_id': '$Location', 'count': {'$sum': 1}}}])
+        if row['_id']
+    }
+    transfers = _monthly_counts(db.transfer_list, since)
+    disposals = _monthly_counts(db.disposal_list, since)
+
+    locations = set(assets) | set(transfers) | set(disposals)
+    since_key = since.strftime('%Y-%m')
+    ops = [
+        op for location in locations | set(stored)
+        for op in _count_updates(location, stored.get(location, {}), assets, transfers, disposals, since_key)
+    ]
+    ops.append(UpdateOne({'_id': META_ID}, {'$set': {'refreshedAt': now}}, upsert=True))
+    summary.bulk_write(ops, ordered=False)
+    return len(locations)
+
+
+def refresh_stats_locked(db, now=None):
+    """refresh_stats under the lock in the meta document, so only one process refreshes
+    at a time. Returns None without refreshing when another process holds the lock."""
+    now = now or _now()
+    until = now + datetime.timedelta(seconds=STATS_REFRESH_LEASE)
+    summary = db[STATS_COLLECTION]
+    try:
+        summary.find_one_and_update(
+            {'_id': META_ID, '$or': [{'refreshingUntil': {'$exists': False}}, {'refreshingUntil': {'$lt': now}}]},
+            {'$set': {'refreshingUntil': until}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The meta document exists and its lock is held
+        return None
+    try:
+        return refresh_stats(db, now)
+    finally:
+        summary.update_one({'_id': META_ID, 'refreshingUntil': until}, {'$unset': {'refreshingUntil': ''}})
+
+
+def apply_stats_changes(db, changes):
+    """Incrementally apply (location, field, delta) changes, e.g. ('P1', 'transfers.2025-01', 1)."""
+    totals = {}
+    for location, field, delta in changes:
+        if location and field:
+            totals[(location, field)] = totals.get((location, field), 0) + delta
+    ops = [
+        UpdateOne({'_id': location}, {'$inc': {field: delta}}, upsert=True)
+        for (location, field), delta in totals.items() if delta
+    ]
+    if ops:
+        db[STATS_COLLECTION].bulk_write(ops, ordered=False)
+
+
+def refreshed_at(db):
+    meta = db[STATS_COLLECTION].find_one({'_id': META_ID})
+    return meta.get('refreshedAt') if meta else None
+
+
+def main():
+    client = create_client()
+    db = get_database(client)
+    try:
+        count = refresh_stats_locked(db)
+        if count is None:
+            print("A stats refresh is already running.")
+        else:
+            print(f"Refreshed stats for {count} locations.")
+    except Exception as e:
+        print(f"Error during stats refresh: {e}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,13 @@
-import pymongo
+from db import create_client, get_database
+from cache import bump_version
 
-# Database connection details (same as in app.py)
-MONGO_URI = "mongodb://094510.xyz:8827/"
-DATABASE_NAME = "pwasset"
 USER_ID_TO_UPDATE = "wuchunkei"
 PARK_IDS_TO_ADD = ["NP360", "TEST"]  # Add both park IDs
 
 try:
     # Establish connection
-    client = pymongo.MongoClient(MONGO_URI)
-    db = client[DATABASE_NAME]
+    client = create_client()
+    db = get_database(client)
     users_collection = db.users
 
     # Find the user and update the parkIds array
@@ -20,6 +18,8 @@ try:
 
     if result.matched_count > 0:
         if result.modified_count > 0:
+            # Make running backends drop their cached copy of the user
+            bump_version(db, 'users')
             print(f"Successfully updated parkIds for user '{USER_ID_TO_UPDATE}'.")
         else:
             print(f"All specified parkIds already exist for user '{USER_ID_TO_UPDATE}'. No update needed.")
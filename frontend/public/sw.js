@@ -0,0 +1,54 @@
+// Service worker: keeps the app shell available offline and wakes open pages
+// to replay the offline outbox when connectivity returns (Background Sync).
+// Data itself lives in IndexedDB (src/offlineStore.js); /api is never cached here.
+const SHELL_CACHE = 'pwasset-shell-v1';
+const SHELL_URLS = ['/', '/index.html', '/manifest.webmanifest'];
+
+self.addEventListener('install', (event) => {
+  self.skipWaiting();
+  event.waitUntil(caches.open(SHELL_CACHE).then(cache => cache.addAll(SHELL_URLS)).catch(() => {}));
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(key => key !== SHELL_CACHE).map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+// Network first, so a deploy (or the Vite dev server) is always picked up when
+// online; the last good copy is served when the network is unavailable.
+self.addEventListener('fetch', (event) => {
+  const { request } = event;
+  const url = new URL(request.url);
+  if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname.startsWith('/api/')) {
+    return;
+  }
+  event.respondWith(
+    fetch(request)
+      .then(response => {
+        if (response.ok) {
+          const copy = response.clone();
+          caches.open(SHELL_CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+      })
+      .catch(() => caches.match(request).then(cached => {
+        if (cached) return cached;
+        // Client-side routes (e.g. /dashboard) all load the same page
+        if (request.mode === 'navigate') return caches.match('/index.html');
+        return Response.error();
+      }))
+  );
+});
+
+// The token lives in the page, so the page does the replay; just tell it to
+self.addEventListener('sync', (event) => {
+  if (event.tag === 'pwasset-outbox') {
+    event.waitUntil(
+      self.clients.matchAll({ type: 'window', includeUncontrolled: true })
+        .then(clients => clients.forEach(client => client.postMessage({ type: 'flush-outbox' })))
+    );
+  }
+});
@@ -1,11 +1,17 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
-import axios from 'axios';
-
-// Use relative path and dev proxy to avoid localhost issues for clients
-const API_BASE_URL = '';
-
-const AssetList = ({ selectedParks }) => {
+import { readRows, syncStore, enqueue, flushOutbox, pendingCount, eventsUrl } from './offlineStore';
+
+// Rows are read from the offline store (IndexedDB), which is synced with the server
+// in the background; writes are queued there and replayed when online.
+const TAB_KINDS = { details: 'assets', transfer: 'transfers', disposal: 'disposals' };
+// Coalesce bursts of change events into one sync
+const EVENT_SYNC_DELAY_MS = 500;
+// Backoff for reopening a change stream that failed or was refused
+const EVENTS_RETRY_MIN_MS = 5000;
+const EVENTS_RETRY_MAX_MS = 60000;
+
+const AssetList = ({ selectedParks, userParkIds }) => {
   const navigate = useNavigate();
   const [activeTab, setActiveTab] = useState('details'); // 'details', 'transfer', 'disposal'
   const [data, setData] = useState([]);
@@ -44,44 +50,116 @@ const AssetList = ({ selectedParks }) => {
   const routerLocation = useLocation();
   const [highlightOldCode, setHighlightOldCode] = useState('');
 
-  useEffect(() => {
-    const fetchData = async () => {
-      if (!selectedParks || selectedParks.length === 0) {
-        setData([]);
-        return;
-      }
+  // offline store states
+  const [storeVersion, setStoreVersion] = useState(0); // bumped whenever the store changes
+  const [pending, setPending] = useState(0);
+  const [rejected, setRejected] = useState([]);
 
-      setLoading(true);
+  // Pull server changes into the store, then re-read the current tab
+  const refresh = useCallback(async () => {
+    if (!userParkIds || userParkIds.length === 0) return;
+    setLoading(true);
+    try {
+      await syncStore(userParkIds);
       setError(null);
+    } catch (err) {
+      // Offline or server unreachable: keep showing the saved rows
+      if (navigator.onLine !== false) setError('Failed to sync, showing saved data.');
+      console.error(err);
+    } finally {
+      setLoading(false);
+      setStoreVersion(v => v + 1);
+      setPending(await pendingCount().catch(() => 0));
+    }
+  }, [userParkIds]);
 
-      let endpoint = '';
-      if (activeTab === 'details') {
-        endpoint = '/api/assets';
-      } else if (activeTab === 'transfer') {
-        endpoint = '/api/transfers';
-      } else if (activeTab === 'disposal') {
-        endpoint = '/api/disposals';
-      }
+  // Send queued writes, keep the ones the server refused for display, then sync
+  const flush = useCallback(async () => {
+    try {
+      const failures = await flushOutbox();
+      if (failures.length) setRejected(prev => [...prev, ...failures]);
+    } catch (err) {
+      // Still offline: the writes stay queued
+      console.error(err);
+    }
+    await refresh();
+  }, [refresh]);
 
+  useEffect(() => {
+    let cancelled = false;
+    const parkIds = (selectedParks || []).map(p => p.parkId);
+    if (parkIds.length === 0) {
+      setData([]);
+      return;
+    }
+    readRows(TAB_KINDS[activeTab], parkIds)
+      .then(rows => { if (!cancelled) setData(rows); })
+      .catch(err => {
+        if (!cancelled) setError(`Failed to read ${activeTab} data.`);
+        console.error(err);
+      });
+    return () => { cancelled = true; };
+  }, [selectedParks, activeTab, storeVersion]);
+
+  // Initial sync, replay on reconnect / Background Sync, and live updates over SSE
+  useEffect(() => {
+    flush();
+    const onOnline = () => flush();
+    const onWorkerMessage = (e) => { if (e.data?.type === 'flush-outbox') flush(); };
+    window.addEventListener('online', onOnline);
+    navigator.serviceWorker?.addEventListener('message', onWorkerMessage);
+
+    let timer = null;
+    let retryTimer = null;
+    let events = null;
+    let closed = false;
+    let retryDelay = EVENTS_RETRY_MIN_MS;
+    const onChange = () => {
+      clearTimeout(timer);
+      timer = setTimeout(refresh, EVENT_SYNC_DELAY_MS);
+    };
+    const retry = () => {
+      // Catch up meanwhile, then reopen with a fresh ticket
+      retryTimer = setTimeout(() => { refresh(); connect(); }, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, EVENTS_RETRY_MAX_MS);
+    };
+    const connect = async () => {
+      let url;
       try {
-        const token = localStorage.getItem('token');
-        const locations = selectedParks.map(p => p.parkId).join(',');
-        const response = await axios.get(`${API_BASE_URL}${endpoint}`,
-         {
-          headers: { Authorization: `Bearer ${token}` },
-          params: { locations }
-        });
-        setData(response.data);
+        url = await eventsUrl();
       } catch (err) {
-        setError(`Failed to fetch ${activeTab} data.`);
-        console.error(err);
-      } finally {
-        setLoading(false);
+        if (!closed) retry();
+        return;
       }
+      if (closed) return;
+      events = new EventSource(url);
+      events.addEventListener('ready', () => { retryDelay = EVENTS_RETRY_MIN_MS; });
+      ['change', 'delete', 'resync'].forEach(type => events.addEventListener(type, onChange));
+      events.onerror = () => {
+        // The ticket is single-use, so the browser's own reconnect would be refused;
+        // also covers 503 when the server's stream slots are taken
+        events.close();
+        if (!closed) retry();
+      };
     };
-
-    fetchData();
-  }, [selectedParks, activeTab]);
+    connect();
+    return () => {
+      clearTimeout(timer);
+      clearTimeout(retryTimer);
+      closed = true;
+      events?.close();
+      window.removeEventListener('online', onOnline);
+      navigator.serviceWorker?.removeEventListener('message', onWorkerMessage);
+    };
+  }, [flush, refresh]);
+
+  // Queue a write, show it straight away and try to send it
+  const queueWrite = async (action, body, version = null) => {
+    await enqueue(TAB_KINDS[activeTab], action, body, version);
+    setStoreVersion(v => v + 1);
+    setPending(await pendingCount());
+    if (navigator.onLine !== false) flush();
+  };
 
   // removed dropdown suggestions per request
 
@@ -196,17 +274,12 @@ const AssetList = ({ selectedParks }) => {
   const firstConfirmEdit = () => setConfirmStep('edit');
   const finalConfirmEdit = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const url = activeTab === 'disposal' ? `${API_BASE_URL}/api/disposals/update` : (activeTab === 'transfer' ? `${API_BASE_URL}/api/transfers/update` : `${API_BASE_URL}/api/assets/update`);
-      await axios.post(url, { id: editingId, After: editDraft }, { headers: { Authorization: `Bearer ${token}` } });
-      // refetch
-      const locations = selectedParks.map(p => p.parkId).join(',');
-      const endpoint = activeTab === 'disposal' ? '/api/disposals' : (activeTab === 'transfer' ? '/api/transfers' : '/api/assets');
-      const response = await axios.get(`${API_BASE_URL}${endpoint}`, { headers: { Authorization: `Bearer ${token}` }, params: { locations } });
-      setData(response.data);
+      // Conditional on the version being edited, so a replay cannot overwrite a newer change
+      const row = data.find(r => r._id === editingId);
+      await queueWrite('update', { id: editingId, After: editDraft }, row?.version ?? null);
       cancelEditOrDelete();
     } catch (e) {
-      alert('Update failed: ' + (e?.response?.data?.message || e.message));
+      alert('Update failed: ' + e.message);
     }
   };
   const firstConfirmDelete = (row) => {
@@ -218,22 +291,17 @@ const AssetList = ({ selectedParks }) => {
   };
   const finalConfirmDelete = async () => {
     try {
-      const token = localStorage.getItem('token');
-      const url = activeTab === 'disposal' ? `${API_BASE_URL}/api/disposals/delete` : (activeTab === 'transfer' ? `${API_BASE_URL}/api/transfers/delete` : `${API_BASE_URL}/api/assets/delete`);
-      await axios.post(url, { id: editingId }, { headers: { Authorization: `Bearer ${token}` } });
-      const locations = selectedParks.map(p => p.parkId).join(',');
-      const endpoint = activeTab === 'disposal' ? '/api/disposals' : (activeTab === 'transfer' ? '/api/transfers' : '/api/assets');
-      const response = await axios.get(`${API_BASE_URL}${endpoint}`, { headers: { Authorization: `Bearer ${token}` }, params: { locations } });
-      setData(response.data);
+      const row = data.find(r => r._id === editingId);
+      await queueWrite('delete', { id: editingId }, row?.version ?? null);
       cancelEditOrDelete();
     } catch (e) {
-      alert('Delete failed: ' + (e?.response?.data?.message || e.message));
+      alert('Delete failed: ' + e.message);
     }
   };
 
   const renderTable = () => {
-    if (loading) return <p>Loading...</p>;
-    if (error) return <p style={{ color: 'red' }}>{error}</p>;
+    if (loading && data.length === 0) return <p>Loading...</p>;
+    if (error && data.length === 0) return <p style={{ color: 'red' }}>{error}</p>;
     if (data.length === 0) return <p>No data found.</p>;
 
     let rows = data;
@@ -293,7 +361,7 @@ const AssetList = ({ selectedParks }) => {
             const isTargetHighlight = activeTab === 'disposal' && highlightOldCode && (row['Old Asset Code'] === highlightOldCode);
             const isRowDisposal = (activeTab !== 'disposal') && (tagValue && String(tagValue).toLowerCase() === 'disposal');
             return (
-            <tr key={index} className={(isRowDisposal || isTargetHighlight) ? 'disposal-row' : ''}>
+            <tr key={index} className={(isRowDisposal || isTargetHighlight) ? 'disposal-row' : ''} style={row._pending ? { fontStyle: 'italic' } : undefined} title={row._pending ? 'Waiting to be sent' : undefined}>
               {headers.map(header => {
                 let value;
                 if (header.toLowerCase() === 'operator') {
@@ -425,21 +493,13 @@ const AssetList = ({ selectedParks }) => {
     }
 
     try {
-      const token = localStorage.getItem('token');
       const payload = {
         Location: addForm.location,
         'Old Asset Code': addForm.oldCode || undefined,
         SN: addForm.sn || undefined,
         Details: addForm.details.trim()
       };
-      const res = await axios.post(`${API_BASE_URL}/api/assets/add`, payload, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      const item = res.data?.item;
-      if (item) {
-        // Prepend the new item to current list without refetching
-        setData(prev => [item, ...prev]);
-      }
+      await queueWrite('add', payload);
       setAddSuccess(true);
     } catch (err) {
       console.error(err);
@@ -452,7 +512,6 @@ const AssetList = ({ selectedParks }) => {
     if (!transferForm.oldCode) { setTransferError('Please enter Old Asset Code'); return; }
     if (!transferForm.to) { setTransferError('Please select To'); return; }
     try {
-      const token = localStorage.getItem('token');
       const payload = {
         'Old Asset Code': transferForm.oldCode,
         'By': transferForm.by || undefined,
@@ -460,11 +519,7 @@ const AssetList = ({ selectedParks }) => {
         'Reason': transferForm.reason || 'Operation',
         whenDate: transferForm.whenDate || undefined
       };
-      const res = await axios.post(`${API_BASE_URL}/api/transfers/add`, payload, { headers: { Authorization: `Bearer ${token}` } });
-      const item = res.data?.item;
-      if (item) {
-        setData(prev => [item, ...prev]);
-      }
+      await queueWrite('add', payload);
       setTransferSuccess(true);
     } catch (err) {
       console.error(err);
@@ -480,7 +535,6 @@ const AssetList = ({ selectedParks }) => {
     if ((disposalForm.reasonBase === 'Sold to Third Party' || disposalForm.reasonBase === 'Trade in') && !disposalForm.vendor.trim()) { setDisposalError('Please enter Vendor'); return; }
 
     try {
-      const token = localStorage.getItem('token');
       const payload = {
         Location: disposalForm.location,
         'Old Asset Code': disposalForm.oldCode,
@@ -490,11 +544,7 @@ const AssetList = ({ selectedParks }) => {
         Vendor: disposalForm.vendor || undefined,
         whenDate: disposalForm.whenDate || undefined
       };
-      const res = await axios.post(`${API_BASE_URL}/api/disposals/add`, payload, { headers: { Authorization: `Bearer ${token}` } });
-      const item = res.data?.item;
-      if (item) {
-        setData(prev => [item, ...prev]);
-      }
+      await queueWrite('add', payload);
       setDisposalSuccess(true);
     } catch (err) {
       console.error(err);
@@ -573,6 +623,21 @@ const AssetList = ({ selectedParks }) => {
         </div>
       </div>
       
+      {pending > 0 && (
+        <p style={{ fontStyle: 'italic' }}>{pending} change(s) waiting to be sent{navigator.onLine === false ? ' (offline)' : ''}.</p>
+      )}
+      {rejected.length > 0 && (
+        <div className="error-message" style={{ marginBottom: '0.5rem' }}>
+          <div>Some offline changes were not saved:</div>
+          <ul>
+            {rejected.map(({ op, message }) => (
+              <li key={op.key}>{op.op} {op.body['Old Asset Code'] || op.body.id || ''}: {message}</li>
+            ))}
+          </ul>
+          <button type="button" onClick={() => setRejected([])}>Dismiss</button>
+        </div>
+      )}
+      {error && data.length > 0 && <p style={{ color: 'red' }}>{error}</p>}
       {renderTable()}
 
       {showAddModal && (
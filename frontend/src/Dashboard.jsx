@@ -31,6 +31,7 @@ const Dashboard = ({ user, onLogout }) => {
 
   // 2. Restore User-Specific Data Filtering
   const userParks = useMemo(() => parks.filter(park => user.parkIds.includes(park.parkId)), [parks, user.parkIds]);
+  const userParkIds = useMemo(() => userParks.map(p => p.parkId), [userParks]);
   const availableAreaCodes = useMemo(() => [...new Set(userParks.map(park => park.areaCode))], [userParks]);
   const availableAreas = useMemo(() => areas.filter(area => availableAreaCodes.includes(area.code)), [areas, availableAreaCodes]);
 
@@ -132,7 +133,7 @@ const Dashboard = ({ user, onLogout }) => {
         </div>
       </div>
       <div className="asset-container"> {/* Container for the asset list */}
-        <AssetList selectedParks={selectedParks} />
+        <AssetList selectedParks={selectedParks} userParkIds={userParkIds} />
       </div>
     </div>
   );
@@ -23,12 +23,6 @@ const formatDateIfDate = (value) => {
   return value || 'N/A';
 };
 
-const filterDataByQuery = (rows, q) => {
-  if (!q) return rows;
-  const lower = q.toLowerCase();
-  return rows.filter(row => Object.values(row).some(val => String(val || '').toLowerCase().includes(lower)));
-};
-
 const highlightMatch = (text, q) => {
   const s = String(text ?? 'N/A');
   if (!q) return s;
@@ -52,29 +46,28 @@ const SearchResults = () => {
   const navigate = useNavigate();
   const initialQ = params.get('q') || '';
   const [query, setQuery] = useState(initialQ);
-  const [dataSets, setDataSets] = useState({ assets: [], transfers: [], disposals: [] });
+  const [results, setResults] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
+  // Search runs on the server across assets, transfers and disposals
   useEffect(() => {
-    const fetchAll = async () => {
+    const fetchResults = async () => {
+      if (!initialQ) {
+        setResults([]);
+        return;
+      }
       setLoading(true);
       setError(null);
       try {
         const token = localStorage.getItem('token');
         const selectedIdsCSV = sessionStorage.getItem('selectedParkIds');
         const locations = selectedIdsCSV || '';
-        const headers = { Authorization: `Bearer ${token}` };
-        const [assetsRes, transfersRes, disposalsRes] = await Promise.all([
-          axios.get(`${API_BASE_URL}/api/assets`, { headers, params: { locations } }),
-          axios.get(`${API_BASE_URL}/api/transfers`, { headers, params: { locations } }),
-          axios.get(`${API_BASE_URL}/api/disposals`, { headers, params: { locations } })
-        ]);
-        setDataSets({
-          assets: assetsRes.data || [],
-          transfers: transfersRes.data || [],
-          disposals: disposalsRes.data || []
+        const res = await axios.get(`${API_BASE_URL}/api/search`, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { q: initialQ, locations }
         });
+        setResults((res.data && res.data.items) || []);
       } catch (err) {
         console.error(err);
         setError('Failed to fetch search data.');
@@ -82,20 +75,13 @@ const SearchResults = () => {
         setLoading(false);
       }
     };
-    fetchAll();
-  }, []);
+    fetchResults();
+  }, [initialQ]);
 
-  const combinedRows = useMemo(() => {
+  const rows = useMemo(() => {
     const tagKey = (obj) => obj['Tag'] ?? obj['tag'];
-    const mapWithType = (rows, type) => rows.map(r => ({ ...r, __type: type, __isDisposal: (type === 'Disposal') || String(tagKey(r) || '').toLowerCase() === 'disposal' }));
-    return [
-      ...mapWithType(dataSets.assets, 'Asset'),
-      ...mapWithType(dataSets.transfers, 'Transfer'),
-      ...mapWithType(dataSets.disposals, 'Disposal')
-    ];
-  }, [dataSets]);
-
-  const rows = filterDataByQuery(combinedRows, query);
+    return results.map(({ _type, ...r }) => ({ ...r, __type: _type, __isDisposal: (_type === 'Disposal') || String(tagKey(r) || '').toLowerCase() === 'disposal' }));
+  }, [results]);
 
   // Fixed headers for assets; dynamic otherwise, plus Type column
   const assetHeaders = ['Location', 'Old Asset Code', 'New Asset Code', 'SN', 'Details', 'Tag', 'operator'];
@@ -117,7 +103,7 @@ const SearchResults = () => {
           <input
             className="search-input"
             type="text"
-            placeholder="Search…"
+            placeholder="Any part of a code or SN, or words in Details…"
             value={query}
             onChange={(e) => setQuery(e.target.value)}
             onKeyDown={(e) => { if (e.key === 'Enter') handleSearch(); }}
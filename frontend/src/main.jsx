@@ -7,4 +7,12 @@ ReactDOM.createRoot(document.getElementById('root')).render(
   <React.StrictMode>
     <App />
   </React.StrictMode>,
-)
\ No newline at end of file
+)
+
+// Service worker for the offline app shell and Background Sync. Off in dev unless
+// VITE_SERVICE_WORKER=1, so it never serves stale modules to the Vite dev server.
+if ('serviceWorker' in navigator && (import.meta.env.PROD || import.meta.env.VITE_SERVICE_WORKER === '1')) {
+  window.addEventListener('load', () => {
+    navigator.serviceWorker.register('/sw.js').catch(err => console.error('Service worker registration failed', err));
+  });
+}
@@ -0,0 +1,250 @@
+import axios from 'axios';
+
+// Local copy of the user's parks' assets, transfers and disposals in IndexedDB,
+// kept current with /api/sync, plus an outbox of writes made while offline
+// (replayed through /api/outbox with one idempotency key per write).
+const API_BASE_URL = '';
+const DB_NAME = 'pwasset';
+const DB_VERSION = 1;
+export const KINDS = ['assets', 'transfers', 'disposals'];
+const PAGE_SIZE = 1000;
+const OUTBOX_BATCH = 50;
+const SYNC_TAG = 'pwasset-outbox';
+
+const authHeaders = () => ({ Authorization: `Bearer ${localStorage.getItem('token')}` });
+
+const promisify = (req) => new Promise((resolve, reject) => {
+  req.onsuccess = () => resolve(req.result);
+  req.onerror = () => reject(req.error);
+});
+
+const done = (tx) => new Promise((resolve, reject) => {
+  tx.oncomplete = () => resolve();
+  tx.onerror = () => reject(tx.error);
+  tx.onabort = () => reject(tx.error);
+});
+
+let dbPromise = null;
+const openDb = () => {
+  if (!dbPromise) {
+    dbPromise = new Promise((resolve, reject) => {
+      const req = indexedDB.open(DB_NAME, DB_VERSION);
+      req.onupgradeneeded = () => {
+        const db = req.result;
+        KINDS.forEach(kind => {
+          db.createObjectStore(kind, { keyPath: '_id' }).createIndex('Location', 'Location');
+        });
+        db.createObjectStore('meta');
+        db.createObjectStore('outbox', { keyPath: 'seq', autoIncrement: true });
+      };
+      req.onsuccess = () => resolve(req.result);
+      req.onerror = () => reject(req.error);
+    });
+  }
+  return dbPromise;
+};
+
+const getMeta = async (key) => {
+  const db = await openDb();
+  return promisify(db.transaction('meta').objectStore('meta').get(key));
+};
+
+const setMeta = async (values) => {
+  const db = await openDb();
+  const tx = db.transaction('meta', 'readwrite');
+  Object.entries(values).forEach(([key, value]) => tx.objectStore('meta').put(value, key));
+  return done(tx);
+};
+
+// Rows of one kind in the given parks, newest first like the API
+export const readRows = async (kind, parkIds) => {
+  const db = await openDb();
+  const index = db.transaction(kind).objectStore(kind).index('Location');
+  const lists = await Promise.all(parkIds.map(id => promisify(index.getAll(id))));
+  return lists.flat().sort((a, b) => String(b.When || '').localeCompare(String(a.When || '')));
+};
+
+const writeRows = async (kind, rows, deletedIds = []) => {
+  const db = await openDb();
+  const tx = db.transaction(kind, 'readwrite');
+  const store = tx.objectStore(kind);
+  // Deletions first: a row moved between parks is listed in both
+  deletedIds.forEach(id => store.delete(id));
+  rows.forEach(row => store.put(row));
+  return done(tx);
+};
+
+const readOutbox = async (limit) => {
+  const db = await openDb();
+  return promisify(db.transaction('outbox').objectStore('outbox').getAll(undefined, limit));
+};
+
+export const pendingCount = async () => {
+  const db = await openDb();
+  return promisify(db.transaction('outbox').objectStore('outbox').count());
+};
+
+// Show a queued write in the local store before the server has seen it
+const applyLocal = async (op) => {
+  const [kind, action] = op.op.split('/');
+  const db = await openDb();
+  const tx = db.transaction(kind, 'readwrite');
+  const store = tx.objectStore(kind);
+  const { body } = op;
+  if (action === 'add') {
+    const when = body.whenDate ? `${body.whenDate}T08:00:00` : new Date().toISOString().slice(0, 19);
+    store.put({
+      ...body,
+      _id: `local-${op.key}`,
+      When: when,
+      Location: body.Location || body.To,
+      Reason: body.Reason || body.reasonBase,
+      _pending: true
+    });
+  } else if (action === 'update') {
+    const row = await promisify(store.get(body.id));
+    if (row) store.put({ ...row, ...body.After, _pending: true });
+  } else if (action === 'delete') {
+    store.delete(body.id);
+  }
+  return done(tx);
+};
+
+const reapplyOutbox = async () => {
+  for (const op of await readOutbox()) {
+    await applyLocal(op);
+  }
+};
+
+// Load every row of the given parks, page by page
+const fullLoad = async (locations) => {
+  for (const kind of KINDS) {
+    const db = await openDb();
+    const tx = db.transaction(kind, 'readwrite');
+    tx.objectStore(kind).clear();
+    await done(tx);
+    let cursor = null;
+    do {
+      const response = await axios.get(`${API_BASE_URL}/api/${kind}`, {
+        headers: authHeaders(),
+        params: { locations, limit: PAGE_SIZE, ids: 1, ...(cursor ? { cursor } : {}) }
+      });
+      await writeRows(kind, response.data.items);
+      cursor = response.data.nextCursor;
+    } while (cursor);
+  }
+};
+
+const runSync = async (parkIds) => {
+  const locations = [...parkIds].sort().join(',');
+  const [token, syncedLocations] = await Promise.all([getMeta('syncToken'), getMeta('locations')]);
+  if (token && syncedLocations === locations) {
+    const response = await axios.get(`${API_BASE_URL}/api/sync`, { headers: authHeaders(), params: { since: token, locations } });
+    if (!response.data.reset) {
+      for (const kind of KINDS) {
+        await writeRows(kind, response.data.changed[kind], response.data.deleted[kind]);
+      }
+      await setMeta({ syncToken: response.data.token });
+      await reapplyOutbox();
+      return;
+    }
+  }
+  // No baseline yet, parks changed or the token is too old: take a token, then load everything
+  const start = await axios.get(`${API_BASE_URL}/api/sync`, { headers: authHeaders() });
+  await fullLoad(locations);
+  await setMeta({ syncToken: start.data.token, locations });
+  await reapplyOutbox();
+};
+
+// URL for an EventSource on /api/events, authenticated with a single-use ticket
+// (EventSource cannot send the token header); a reconnect needs a new one
+export const eventsUrl = async () => {
+  const response = await axios.post(`${API_BASE_URL}/api/events/ticket`, {}, { headers: authHeaders() });
+  return `${API_BASE_URL}/api/events?ticket=${encodeURIComponent(response.data.ticket)}`;
+};
+
+let syncing = null;
+// Bring the local store up to date for the user's parks; concurrent calls share one run
+export const syncStore = (parkIds) => {
+  if (!syncing) {
+    syncing = runSync(parkIds).finally(() => { syncing = null; });
+  }
+  return syncing;
+};
+
+const newKey = () => (window.crypto?.randomUUID
+  ? window.crypto.randomUUID()
+  : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
+
+// Let the service worker wake the page for a replay once connectivity returns
+const registerSync = async () => {
+  try {
+    const registration = await navigator.serviceWorker?.getRegistration();
+    await registration?.sync?.register(SYNC_TAG);
+  } catch (e) {
+    // No Background Sync: the page replays on its 'online' event instead
+  }
+};
+
+// Queue a write (e.g. enqueue('assets', 'update', { id, After })) and apply it locally;
+// call flushOutbox() to send it. version, when given, makes the replay conditional
+// (If-Match) on the row's version.
+export const enqueue = async (kind, action, body, version = null) => {
+  const op = { key: newKey(), op: `${kind}/${action}`, body, ifMatch: version, queuedAt: Date.now() };
+  const db = await openDb();
+  const tx = db.transaction('outbox', 'readwrite');
+  tx.objectStore('outbox').add(op);
+  await done(tx);
+  await applyLocal(op);
+  registerSync();
+  return op;
+};
+
+const runFlush = async () => {
+  const rejected = [];
+  while (navigator.onLine !== false) {
+    const ops = await readOutbox(OUTBOX_BATCH);
+    if (!ops.length) break;
+    // Network errors throw here and leave the whole batch queued
+    const response = await axios.post(`${API_BASE_URL}/api/outbox`, {
+      ops: ops.map(({ key, op, body, ifMatch }) => ({ key, op, body, ifMatch }))
+    }, { headers: authHeaders() });
+
+    const db = await openDb();
+    const tx = db.transaction(['outbox', ...KINDS], 'readwrite');
+    let retryLater = false;
+    response.data.results.forEach((result, i) => {
+      const op = ops[i];
+      // Keep order: a server error stops here and the rest waits for the next attempt
+      if (retryLater || result.status >= 500) {
+        retryLater = true;
+        return;
+      }
+      tx.objectStore('outbox').delete(op.seq);
+      const [kind, action] = op.op.split('/');
+      if (action === 'add') {
+        tx.objectStore(kind).delete(`local-${op.key}`);
+        if (result.body?.item) tx.objectStore(kind).put(result.body.item);
+      }
+      if (result.status >= 400) {
+        rejected.push({ op, message: result.body?.message || `HTTP ${result.status}` });
+      }
+    });
+    await done(tx);
+    if (retryLater) break;
+  }
+  if (rejected.length) {
+    // Rejected edits were already shown locally; reload from the server to undo them
+    await setMeta({ syncToken: null });
+  }
+  return rejected;
+};
+
+let flushing = null;
+// Replay queued writes in order; resolves with the writes the server rejected
+export const flushOutbox = () => {
+  if (!flushing) {
+    flushing = runFlush().finally(() => { flushing = null; });
+  }
+  return flushing;
+};